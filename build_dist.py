@@ -5,13 +5,16 @@ import shutil
 
 # Directories to completely ignore
 EXCLUDE_DIRS = {
-    '.git', '__pycache__', 'venv', '.agent', '.gemini', 'brain', 'website', '.pytest_cache'
+    '.git', '__pycache__', 'venv', '.agent', '.gemini', 'brain', 'website', '.pytest_cache',
+    'video_note_cache'
 }
 
 # File patterns to ignore
 EXCLUDE_FILE_PATTERNS = [
     r'\.session$',
     r'database\.db$',
+    r'\.db-(wal|shm)$',
+    r'\.db\.pending$',
     r'sniffer_log\.html$',
     r'\.zip$',
     r'\.pyc$',
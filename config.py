@@ -13,6 +13,44 @@ DATABASE_PATH = 'content_cloner.db'
 # Задержка при FloodWait (в секундах)
 FLOODWAIT_RETRY_DELAY = '1'
 # Максимальное количество попыток при FloodWait
-MAX_FLOODWAIT_RETRIES = '5'
+MAX_FLOODWAIT_RETRIES = '20'
 # Режим отладки (True/False)
-DEBUG_MODE = 'False'
\ No newline at end of file
+DEBUG_MODE = 'False'
+# Количество соединений для чтения из базы данных
+DB_READER_POOL_SIZE = '4'
+# Сколько ID обработанных сообщений держать в памяти (кэш для всех доноров)
+PROCESSED_CACHE_SIZE = '50000'
+# Как часто (в секундах) сохранять отметки обработанных постов и статистику
+JOURNAL_FLUSH_INTERVAL = '0.5'
+# Сохранять сразу, если накопилось столько записей
+JOURNAL_FLUSH_SIZE = '200'
+# Режим реального времени: 'push' (обновления Telegram) или 'poll' (опрос каждые 5 секунд)
+REALTIME_MODE = 'push'
+# Сколько секунд ждать новых частей альбома перед отправкой
+ALBUM_QUIET_PERIOD = '1.5'
+# Файлы до этого размера (в МБ) пересылаются через память, без временных файлов на диске
+IN_MEMORY_TRANSFER_LIMIT_MB = '20'
+# Сколько файлов скачивать параллельно при полном скрапе истории
+BACKFILL_DOWNLOAD_CONCURRENCY = '3'
+# Сколько задач скрапа (из очереди в админ-панели) выполнять одновременно
+SCRAPE_WORKERS = '2'
+# Сколько сообщений в секунду отправлять в один канал
+SEND_RATE_PER_CHAT = '1'
+# Сколько сообщений можно отправить в один канал подряд без паузы
+SEND_BURST_PER_CHAT = '3'
+# Сколько сообщений в секунду отправлять всего (на один аккаунт/бота)
+SEND_RATE_GLOBAL = '25'
+# Сколько секунд доверять найденному каналу без повторной проверки
+PEER_CACHE_TTL = '86400'
+# Сколько секунд не пытаться снова найти канал, который не удалось найти
+PEER_NEGATIVE_TTL = '300'
+# Как часто (в секундах) заново проверять доступ бота к целевому каналу
+TARGET_ACCESS_TTL = '3600'
+# Сколько конвертаций видео-кружков (ffmpeg) запускать одновременно (0 = по числу ядер процессора)
+TRANSCODE_CONCURRENCY = '0'
+# Максимальное время одной конвертации (в секундах)
+TRANSCODE_TIMEOUT = '120'
+# Папка для сконвертированных видео-кружков (повторно не конвертируются)
+VIDEO_NOTE_CACHE_DIR = 'video_note_cache'
+# Максимальный размер этой папки (в МБ), старые файлы удаляются
+VIDEO_NOTE_CACHE_MB = '500'
@@ -1,14 +1,433 @@
+import asyncio
+import bisect
+import json
+import os
+from array import array
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
 import aiosqlite
 from config import DATABASE_PATH
 
+try:
+    from config import DB_READER_POOL_SIZE
+except ImportError:
+    DB_READER_POOL_SIZE = '4'
+
+try:
+    DB_READER_POOL_SIZE = max(1, int(DB_READER_POOL_SIZE))
+except (TypeError, ValueError):
+    DB_READER_POOL_SIZE = 4
+
+try:
+    from config import PROCESSED_CACHE_SIZE
+except ImportError:
+    PROCESSED_CACHE_SIZE = '50000'
+
+try:
+    PROCESSED_CACHE_SIZE = max(0, int(PROCESSED_CACHE_SIZE))
+except (TypeError, ValueError):
+    PROCESSED_CACHE_SIZE = 50000
+
+try:
+    from config import JOURNAL_FLUSH_INTERVAL, JOURNAL_FLUSH_SIZE
+except ImportError:
+    JOURNAL_FLUSH_INTERVAL = '0.5'
+    JOURNAL_FLUSH_SIZE = '200'
+
+try:
+    JOURNAL_FLUSH_INTERVAL = max(0.0, float(JOURNAL_FLUSH_INTERVAL))
+    JOURNAL_FLUSH_SIZE = max(1, int(JOURNAL_FLUSH_SIZE))
+except (TypeError, ValueError):
+    JOURNAL_FLUSH_INTERVAL = 0.5
+    JOURNAL_FLUSH_SIZE = 200
+
+# Per-connection prepared statement cache (sqlite3 default is 128)
+STATEMENT_CACHE_SIZE = 256
+
+
+class ConnectionPool:
+    """
+    Long-lived SQLite connections: one writer plus a small pool of readers.
+    WAL mode lets the readers run while the writer holds a transaction.
+    """
+
+    def __init__(self, db_path: str, readers: int = DB_READER_POOL_SIZE):
+        self.db_path = db_path
+        self.readers_count = readers
+        self._writer: aiosqlite.Connection | None = None
+        self._readers: asyncio.Queue | None = None
+        self._all_readers: list[aiosqlite.Connection] = []
+        self._write_lock: asyncio.Lock | None = None
+        self._open_lock: asyncio.Lock | None = None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.db_path, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = aiosqlite.Row
+        await conn.execute('PRAGMA journal_mode=WAL')
+        await conn.execute('PRAGMA synchronous=NORMAL')
+        await conn.execute('PRAGMA busy_timeout=5000')
+        return conn
+
+    async def open(self):
+        if self._writer is not None:
+            return
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+            writer = await self._connect()
+            readers = asyncio.Queue()
+            for _ in range(self.readers_count):
+                conn = await self._connect()
+                self._all_readers.append(conn)
+                readers.put_nowait(conn)
+            self._readers = readers
+            self._write_lock = asyncio.Lock()
+            self._writer = writer
+
+    async def close(self):
+        writer = self._writer
+        self._writer = None
+        self._readers = None
+        readers, self._all_readers = self._all_readers, []
+        for conn in readers:
+            try:
+                await conn.close()
+            except Exception:
+                pass
+        if writer is not None:
+            await writer.close()
+
+    @asynccontextmanager
+    async def reader(self):
+        """Borrow a read-only connection from the pool"""
+        await self.open()
+        readers = self._readers
+        conn = await readers.get()
+        try:
+            yield conn
+        finally:
+            readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Exclusive access to the writer connection; rolls back on error"""
+        await self.open()
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+
+
+class ProcessedIdCache:
+    """
+    Recently processed message ids kept in memory, one sorted array per donor.
+    Holds at most max_ids ids in total; the least recently used donors are
+    evicted first.
+    """
+
+    def __init__(self, max_ids: int = PROCESSED_CACHE_SIZE):
+        self.max_ids = max_ids
+        self._channels: OrderedDict[str, array] = OrderedDict()
+        self._size = 0
+
+    def contains(self, channel_id: str, message_id: int) -> bool:
+        ids = self._channels.get(channel_id)
+        if ids is None:
+            return False
+        self._channels.move_to_end(channel_id)
+        i = bisect.bisect_left(ids, message_id)
+        return i < len(ids) and ids[i] == message_id
+
+    def add(self, channel_id: str, message_id: int):
+        if self.max_ids <= 0:
+            return
+        ids = self._channels.get(channel_id)
+        if ids is None:
+            ids = self._channels[channel_id] = array('q')
+        self._channels.move_to_end(channel_id)
+        i = bisect.bisect_left(ids, message_id)
+        if i < len(ids) and ids[i] == message_id:
+            return
+        ids.insert(i, message_id)
+        self._size += 1
+        self._evict()
+
+    def invalidate(self, channel_id: str | None = None):
+        """Forget one donor, or everything when channel_id is None"""
+        if channel_id is None:
+            self._channels.clear()
+            self._size = 0
+            return
+        ids = self._channels.pop(channel_id, None)
+        if ids is not None:
+            self._size -= len(ids)
+
+    def _evict(self):
+        while self._size > self.max_ids and self._channels:
+            channel_id, ids = next(iter(self._channels.items()))
+            if len(self._channels) == 1:
+                # Only the active donor is left: drop its oldest ids
+                excess = self._size - self.max_ids
+                del ids[:excess]
+                self._size -= excess
+                return
+            self.invalidate(channel_id)
+
+
+class WriteBehindJournal:
+    """
+    Pending processed-marks and statistics increments waiting for a group commit.
+
+    Every record is appended to a small sidecar file before the call returns,
+    so a crashed process replays it on the next start. Records carry a sequence
+    number; the highest committed one is stored in journal_state, which makes
+    the replay skip what already reached the database.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.seq = 0
+        self._file = None
+        self._marks: dict[str, set[int]] = {}
+        self._stats: dict[int, int] = {}
+        self._inflight_marks: dict[str, set[int]] = {}
+        # File lines of the pending and in-flight records, to rewrite the file
+        # down to what is still uncommitted after each commit
+        self._lines: list[str] = []
+        self._inflight_lines: list[str] = []
+        self._unsynced = False
+        self._pending = 0
+
+    @property
+    def pending_count(self) -> int:
+        return self._pending
+
+    def read_records(self, after_seq: int) -> list[tuple]:
+        """Records left in the file by a previous run with seq > after_seq"""
+        records = []
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.rstrip('\n').split('\t')
+                try:
+                    seq = int(parts[0])
+                    if parts[1] == 'm':
+                        record = (seq, 'm', parts[2], int(parts[3]))
+                    elif parts[1] == 's':
+                        record = (seq, 's', int(parts[2]))
+                    else:
+                        continue
+                except (IndexError, ValueError):
+                    # Torn last line of a crashed write
+                    continue
+                self.seq = max(self.seq, seq)
+                if seq > after_seq:
+                    records.append(record)
+        return records
+
+    def open(self, last_seq: int):
+        self.seq = max(self.seq, last_seq)
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _append(self, line: str):
+        self.seq += 1
+        line = f"{self.seq}\t{line}\n"
+        if self._file is not None:
+            # Reaches the OS right away (survives a crash of the process);
+            # the fsync is batched in sync()
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced = True
+        self._lines.append(line)
+        self._pending += 1
+
+    def add_mark(self, channel_id: str, message_id: int):
+        self._append(f"m\t{channel_id}\t{message_id}")
+        self._marks.setdefault(channel_id, set()).add(message_id)
+
+    def add_stat(self, pair_id: int):
+        self._append(f"s\t{pair_id}")
+        self._stats[pair_id] = self._stats.get(pair_id, 0) + 1
+
+    def has_mark(self, channel_id: str, message_id: int) -> bool:
+        return (
+            message_id in self._marks.get(channel_id, ())
+            or message_id in self._inflight_marks.get(channel_id, ())
+        )
+
+    async def sync(self):
+        """fsync the records appended since the last call, off the event loop"""
+        if self._file is None or not self._unsynced:
+            return
+        self._unsynced = False
+        await asyncio.to_thread(os.fsync, self._file.fileno())
+
+    def take(self):
+        """Move pending records to the in-flight batch for a commit"""
+        marks, stats = self._marks, self._stats
+        self._marks, self._stats = {}, {}
+        self._inflight_marks = marks
+        self._inflight_lines, self._lines = self._lines, []
+        self._pending = 0
+        return marks, stats, self.seq
+
+    def committed(self, seq: int):
+        self._inflight_marks = {}
+        self._inflight_lines = []
+        if self._file is None:
+            return
+        if not self._lines:
+            # Nothing was appended during the commit: start a fresh file
+            self._file.truncate(0)
+            return
+        # Keep only the records appended during the commit, so the file stays
+        # small under constant load; replaced atomically in case we crash here
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(self._lines)
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._unsynced = True
+
+    def restore(self, marks: dict[str, set[int]], stats: dict[int, int]):
+        """Put back a batch whose commit failed"""
+        for channel_id, ids in marks.items():
+            self._marks.setdefault(channel_id, set()).update(ids)
+            self._pending += len(ids)
+        for pair_id, count in stats.items():
+            self._stats[pair_id] = self._stats.get(pair_id, 0) + count
+            self._pending += count
+        self._inflight_marks = {}
+        self._lines = self._inflight_lines + self._lines
+        self._inflight_lines = []
+
+
+def _id_runs(ids) -> list[tuple[int, int]]:
+    """Collapse message ids into sorted (start, end) runs"""
+    runs = []
+    for mid in sorted(ids):
+        if runs and mid <= runs[-1][1] + 1:
+            runs[-1][1] = max(runs[-1][1], mid)
+        else:
+            runs.append([mid, mid])
+    return [(start, end) for start, end in runs]
+
+
+def pair_delivery_key(donor_channel: str, pair_id: int) -> str:
+    """
+    processed_ranges key for the messages one pair already got while the
+    donor-wide mark waits for its other pairs
+    """
+    return f"{donor_channel}#{pair_id}"
+
 
 class Database:
     def __init__(self):
         self.db_path = DATABASE_PATH
+        self.pool = ConnectionPool(self.db_path)
+        self.processed_cache = ProcessedIdCache()
+        self.journal = WriteBehindJournal(f"{self.db_path}.pending")
+        self._flush_lock: asyncio.Lock | None = None
+        self._flush_task: asyncio.Task | None = None
+        # Bumped on every link rule change; compiled rule sets compare against it
+        self.link_rules_version = 0
+        # Same for button rules and the cached markups
+        self.button_rules_version = 0
+
+    async def close(self):
+        """Close pooled connections (called on shutdown)"""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        self.journal.close()
+        await self.pool.close()
+
+    async def flush(self):
+        """Commit pending processed marks and statistics in one transaction"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self.journal.pending_count:
+                return
+            # One fsync per batch instead of one per record
+            await self.journal.sync()
+            marks, stats, seq = self.journal.take()
+            try:
+                async with self.pool.writer() as db:
+                    await self._apply_journal(db, marks, stats, seq)
+                    await db.commit()
+            except BaseException:
+                self.journal.restore(marks, stats)
+                raise
+            self.journal.committed(seq)
+
+    async def _apply_journal(self, db: aiosqlite.Connection, marks: dict, stats: dict, seq: int):
+        for channel_id, ids in marks.items():
+            for start_id, end_id in _id_runs(ids):
+                await self._merge_processed_range(db, channel_id, start_id, end_id)
+        for pair_id, count in stats.items():
+            await db.execute('''
+                UPDATE statistics
+                SET posts_cloned = posts_cloned + ?,
+                    last_cloned_at = CURRENT_TIMESTAMP
+                WHERE pair_id = ?
+            ''', (count, pair_id))
+        await db.execute(
+            'INSERT OR REPLACE INTO journal_state (id, last_seq) VALUES (1, ?)',
+            (seq,)
+        )
+
+    async def _replay_journal(self, db: aiosqlite.Connection):
+        """Apply records a previous run appended but never committed"""
+        async with db.execute('SELECT last_seq FROM journal_state WHERE id = 1') as cursor:
+            row = await cursor.fetchone()
+        last_seq = int(row[0]) if row else 0
+
+        records = self.journal.read_records(last_seq)
+        if records:
+            marks, stats = {}, {}
+            for record in records:
+                if record[1] == 'm':
+                    marks.setdefault(record[2], set()).add(record[3])
+                else:
+                    stats[record[2]] = stats.get(record[2], 0) + 1
+            await self._apply_journal(db, marks, stats, self.journal.seq)
+            print(f"Replayed {len(records)} pending database writes from the previous run.")
+        self.journal.open(last_seq)
+
+    def _after_journal_write(self):
+        """Start the flush timer, or tell the caller to flush now"""
+        if self.journal.pending_count >= JOURNAL_FLUSH_SIZE:
+            return True
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+        return False
+
+    async def _flush_later(self):
+        await asyncio.sleep(JOURNAL_FLUSH_INTERVAL)
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Error flushing pending database writes: {e}")
+        # Records written during the flush saw this timer running and did not start one
+        if self.journal.pending_count:
+            self._flush_task = asyncio.create_task(self._flush_later())
 
     async def init_db(self):
         """Initialize database with required tables"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS channel_pairs (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -24,6 +443,10 @@ class Database:
                 await db.execute(
                     "ALTER TABLE channel_pairs ADD COLUMN realtime_enabled INTEGER NOT NULL DEFAULT 0"
                 )
+            if "copy_mode" not in columns:
+                await db.execute(
+                    "ALTER TABLE channel_pairs ADD COLUMN copy_mode INTEGER NOT NULL DEFAULT 0"
+                )
             
             # Statistics table
             await db.execute('''
@@ -73,15 +496,29 @@ class Database:
                 await db.execute("ALTER TABLE button_rules ADD COLUMN url3 TEXT")
             if "custom_buttons_mode" not in btn_columns:
                 await db.execute("ALTER TABLE button_rules ADD COLUMN custom_buttons_mode INTEGER DEFAULT 0")
+            # NULL pair_id = global button set, otherwise the set of one pair
+            if "pair_id" not in btn_columns:
+                await db.execute("ALTER TABLE button_rules ADD COLUMN pair_id INTEGER")
             
-            # Processed messages (to avoid duplicates)
+            # Processed message ids (to avoid duplicates), stored per donor as
+            # merged [start_id, end_id] ranges. The last range's end_id is the
+            # donor's high-water mark; gaps between ranges are the ids that were
+            # skipped or not scraped yet.
             await db.execute('''
-                CREATE TABLE IF NOT EXISTS processed_messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                CREATE TABLE IF NOT EXISTS processed_ranges (
                     channel_id TEXT NOT NULL,
-                    message_id INTEGER NOT NULL,
-                    processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(channel_id, message_id)
+                    start_id INTEGER NOT NULL,
+                    end_id INTEGER NOT NULL,
+                    PRIMARY KEY (channel_id, start_id)
+                ) WITHOUT ROWID
+            ''')
+            migrated = await self._migrate_processed_messages(db)
+
+            # Highest write-behind journal record already committed
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS journal_state (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    last_seq INTEGER NOT NULL
                 )
             ''')
 
@@ -92,12 +529,330 @@ class Database:
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
+
+            # Chat references resolved by each account (client_id = its user id).
+            # status 'ok' keeps the numeric id and username, 'failed' the last error;
+            # verified_at (unix time) drives the TTLs in utils/peer_resolver.py
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS peer_cache (
+                    client_id INTEGER NOT NULL,
+                    chat_ref TEXT NOT NULL,
+                    chat_id INTEGER,
+                    username TEXT,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    verified_at REAL NOT NULL,
+                    PRIMARY KEY (client_id, chat_ref)
+                ) WITHOUT ROWID
+            ''')
+
+            # file_id of media each sending account already uploaded, keyed by
+            # the source file_unique_id, so the same media is never uploaded twice
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS uploaded_media (
+                    sender_id INTEGER NOT NULL,
+                    file_unique_id TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (sender_id, file_unique_id)
+                ) WITHOUT ROWID
+            ''')
+
+            # Cursor of each interrupted history scrape; offset_id is the next
+            # page to fetch in the given direction, everything before it is done
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS scrape_checkpoints (
+                    pair_id INTEGER NOT NULL,
+                    mode TEXT NOT NULL,
+                    direction TEXT NOT NULL,
+                    offset_id INTEGER NOT NULL DEFAULT 0,
+                    sent INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (pair_id, mode)
+                ) WITHOUT ROWID
+            ''')
+
+            # Queued admin scrapes; params is JSON (e.g. {"limit": 10}). Only
+            # queued, running and paused jobs are kept, finished ones are deleted
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS scrape_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    pair_id INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    params TEXT NOT NULL DEFAULT '{}',
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            await db.execute(
+                'CREATE INDEX IF NOT EXISTS idx_scrape_jobs_queue ON scrape_jobs (status, priority, id)'
+            )
+
+            await self._replay_journal(db)
             
             await db.commit()
+        self.journal.committed(self.journal.seq)
+
+        if migrated:
+            # Reclaim the space of the dropped per-message table
+            async with self.pool.writer() as db:
+                await db.execute('VACUUM')
+
+    async def _migrate_processed_messages(self, db: aiosqlite.Connection) -> bool:
+        """Fold the legacy one-row-per-message table into processed_ranges"""
+        async with db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'processed_messages'"
+        ) as cursor:
+            if await cursor.fetchone() is None:
+                return False
+
+        runs = []
+        async with db.execute(
+            'SELECT channel_id, message_id FROM processed_messages ORDER BY channel_id, message_id'
+        ) as cursor:
+            async for channel_id, message_id in cursor:
+                last = runs[-1] if runs else None
+                if last and last[0] == channel_id and message_id <= last[2] + 1:
+                    last[2] = max(last[2], message_id)
+                else:
+                    runs.append([channel_id, message_id, message_id])
+
+        for channel_id, start_id, end_id in runs:
+            await self._merge_processed_range(db, channel_id, start_id, end_id)
+        await db.execute('DROP TABLE processed_messages')
+        await db.execute("DELETE FROM sqlite_sequence WHERE name = 'processed_messages'")
+        return True
+
+    async def _merge_processed_range(self, db: aiosqlite.Connection, channel_id: str, start_id: int, end_id: int):
+        """Add [start_id, end_id] to a donor's ranges, merging overlapping and adjacent ones"""
+        async with db.execute(
+            '''
+            SELECT start_id, end_id FROM processed_ranges
+            WHERE channel_id = ?
+              AND start_id <= ?
+              AND start_id >= COALESCE((
+                  SELECT start_id FROM processed_ranges
+                  WHERE channel_id = ? AND start_id <= ?
+                  ORDER BY start_id DESC LIMIT 1
+              ), ?)
+            ''',
+            (channel_id, end_id + 1, channel_id, start_id - 1, start_id - 1)
+        ) as cursor:
+            rows = [tuple(row) for row in await cursor.fetchall()]
+
+        touching = [(s, e) for s, e in rows if e >= start_id - 1]
+        if any(s <= start_id and e >= end_id for s, e in touching):
+            return
+        new_start = min([start_id] + [s for s, _ in touching])
+        new_end = max([end_id] + [e for _, e in touching])
+        if touching:
+            placeholders = ",".join(["?"] * len(touching))
+            await db.execute(
+                f'DELETE FROM processed_ranges WHERE channel_id = ? AND start_id IN ({placeholders})',
+                (channel_id, *[s for s, _ in touching])
+            )
+        await db.execute(
+            'INSERT INTO processed_ranges (channel_id, start_id, end_id) VALUES (?, ?, ?)',
+            (channel_id, new_start, new_end)
+        )
+
+    async def get_peer(self, client_id: int, chat_ref: str) -> dict | None:
+        async with self.pool.reader() as db:
+            async with db.execute(
+                'SELECT * FROM peer_cache WHERE client_id = ? AND chat_ref = ?',
+                (client_id, chat_ref)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return dict(row) if row else None
+
+    async def save_peers(self, client_id: int, entries: list[tuple]):
+        """Store (chat_ref, chat_id, username, status, error, verified_at) rows"""
+        if not entries:
+            return
+        async with self.pool.writer() as db:
+            await db.executemany(
+                '''
+                INSERT OR REPLACE INTO peer_cache
+                    (client_id, chat_ref, chat_id, username, status, error, verified_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''',
+                [(client_id, *entry) for entry in entries]
+            )
+            await db.commit()
+
+    async def forget_peer(self, client_id: int, chat_ref: str):
+        async with self.pool.writer() as db:
+            await db.execute(
+                'DELETE FROM peer_cache WHERE client_id = ? AND chat_ref = ?',
+                (client_id, chat_ref)
+            )
+            await db.commit()
+
+    async def get_uploaded_file_id(self, sender_id: int, file_unique_id: str) -> str | None:
+        async with self.pool.reader() as db:
+            async with db.execute(
+                'SELECT file_id FROM uploaded_media WHERE sender_id = ? AND file_unique_id = ?',
+                (sender_id, file_unique_id)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row else None
+
+    async def save_uploaded_file_id(self, sender_id: int, file_unique_id: str, file_id: str | None):
+        """Remember an upload, or forget it when file_id is None"""
+        async with self.pool.writer() as db:
+            if file_id is None:
+                await db.execute(
+                    'DELETE FROM uploaded_media WHERE sender_id = ? AND file_unique_id = ?',
+                    (sender_id, file_unique_id)
+                )
+            else:
+                await db.execute(
+                    'INSERT OR REPLACE INTO uploaded_media (sender_id, file_unique_id, file_id) VALUES (?, ?, ?)',
+                    (sender_id, file_unique_id, file_id)
+                )
+            await db.commit()
+
+    async def get_scrape_checkpoint(self, pair_id: int, mode: str) -> dict | None:
+        async with self.pool.reader() as db:
+            async with db.execute(
+                'SELECT * FROM scrape_checkpoints WHERE pair_id = ? AND mode = ?',
+                (pair_id, mode)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return dict(row) if row else None
+
+    async def get_scrape_checkpoints(self) -> list[dict]:
+        async with self.pool.reader() as db:
+            async with db.execute('SELECT * FROM scrape_checkpoints ORDER BY started_at') as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+
+    async def save_scrape_checkpoint(
+        self, pair_id: int, mode: str, direction: str, offset_id: int, sent: int, failed: int
+    ):
+        async with self.pool.writer() as db:
+            await db.execute(
+                '''
+                INSERT INTO scrape_checkpoints (pair_id, mode, direction, offset_id, sent, failed)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (pair_id, mode) DO UPDATE SET
+                    direction = excluded.direction,
+                    offset_id = excluded.offset_id,
+                    sent = excluded.sent,
+                    failed = excluded.failed,
+                    updated_at = CURRENT_TIMESTAMP
+                ''',
+                (pair_id, mode, direction, offset_id, sent, failed)
+            )
+            await db.commit()
+
+    async def delete_scrape_checkpoint(self, pair_id: int, mode: str):
+        async with self.pool.writer() as db:
+            await db.execute(
+                'DELETE FROM scrape_checkpoints WHERE pair_id = ? AND mode = ?',
+                (pair_id, mode)
+            )
+            await db.commit()
+
+    def _scrape_job_row(self, row) -> dict:
+        job = dict(row)
+        job["params"] = json.loads(job["params"] or "{}")
+        return job
+
+    async def add_scrape_job(
+        self, pair_id: int, kind: str, params: dict | None = None, priority: int = 0
+    ) -> tuple[int, bool]:
+        """
+        Queue a scrape job. Returns (job_id, created); an identical job of the
+        pair that is still queued, running or paused is returned instead
+        """
+        params_json = json.dumps(params or {}, sort_keys=True)
+        async with self.pool.writer() as db:
+            async with db.execute(
+                '''
+                SELECT id FROM scrape_jobs
+                WHERE pair_id = ? AND kind = ? AND params = ?
+                ORDER BY id LIMIT 1
+                ''',
+                (pair_id, kind, params_json)
+            ) as cursor:
+                row = await cursor.fetchone()
+                if row:
+                    return row[0], False
+            cursor = await db.execute(
+                'INSERT INTO scrape_jobs (pair_id, kind, params, priority) VALUES (?, ?, ?, ?)',
+                (pair_id, kind, params_json, priority)
+            )
+            await db.commit()
+            return cursor.lastrowid, True
+
+    async def get_scrape_job(self, job_id: int) -> dict | None:
+        async with self.pool.reader() as db:
+            async with db.execute('SELECT * FROM scrape_jobs WHERE id = ?', (job_id,)) as cursor:
+                row = await cursor.fetchone()
+                return self._scrape_job_row(row) if row else None
+
+    async def get_scrape_jobs(self) -> list[dict]:
+        """Jobs in scheduling order: running first, then by priority and age"""
+        async with self.pool.reader() as db:
+            async with db.execute(
+                '''
+                SELECT * FROM scrape_jobs
+                ORDER BY status != 'running', priority DESC, id
+                '''
+            ) as cursor:
+                return [self._scrape_job_row(row) for row in await cursor.fetchall()]
+
+    async def claim_scrape_job(self, busy_pairs: list[int]) -> dict | None:
+        """Mark the next queued job of a pair not in busy_pairs as running and return it"""
+        placeholders = ",".join(["?"] * len(busy_pairs))
+        exclude = f"AND pair_id NOT IN ({placeholders})" if busy_pairs else ""
+        async with self.pool.writer() as db:
+            async with db.execute(
+                f'''
+                SELECT * FROM scrape_jobs
+                WHERE status = 'queued' {exclude}
+                ORDER BY priority DESC, id LIMIT 1
+                ''',
+                busy_pairs
+            ) as cursor:
+                row = await cursor.fetchone()
+            if row is None:
+                return None
+            await db.execute(
+                "UPDATE scrape_jobs SET status = 'running', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (row["id"],)
+            )
+            await db.commit()
+        job = self._scrape_job_row(row)
+        job["status"] = "running"
+        return job
+
+    async def set_scrape_job_status(self, job_id: int, status: str):
+        async with self.pool.writer() as db:
+            await db.execute(
+                'UPDATE scrape_jobs SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                (status, job_id)
+            )
+            await db.commit()
+
+    async def requeue_running_scrape_jobs(self):
+        """Jobs left running by a previous process go back to the queue"""
+        async with self.pool.writer() as db:
+            await db.execute("UPDATE scrape_jobs SET status = 'queued' WHERE status = 'running'")
+            await db.commit()
+
+    async def delete_scrape_job(self, job_id: int):
+        async with self.pool.writer() as db:
+            await db.execute('DELETE FROM scrape_jobs WHERE id = ?', (job_id,))
+            await db.commit()
 
     async def get_user_lang(self, user_id: int) -> str:
         """Get user language preference"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             async with db.execute(
                 'SELECT lang FROM user_settings WHERE user_id = ?',
                 (int(user_id),)
@@ -111,7 +866,7 @@ class Database:
         if lang not in {'ru', 'en'}:
             lang = 'ru'
 
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute(
                 '''
                 INSERT INTO user_settings (user_id, lang, updated_at)
@@ -126,7 +881,7 @@ class Database:
 
     async def add_channel_pair(self, donor_channel: str, target_channel: str):
         """Add a new channel pair"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             cursor = await db.execute(
                 'INSERT INTO channel_pairs (donor_channel, target_channel) VALUES (?, ?)',
                 (donor_channel, target_channel)
@@ -147,21 +902,25 @@ class Database:
 
     async def remove_channel_pair(self, pair_id: int):
         """Remove a channel pair"""
+        await self.flush()
         donor_channel = None
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             # Get channel info to clear processed messages
             async with db.execute('SELECT donor_channel FROM channel_pairs WHERE id = ?', (pair_id,)) as cursor:
                 row = await cursor.fetchone()
                 if row:
                     donor_channel = row[0]
-                    # Try to normalize if it's an ID
-                    await db.execute('DELETE FROM processed_messages WHERE channel_id = ?', (donor_channel,))
-                    # Also try to delete by normalized ID just in case
-                    if donor_channel.startswith("-100"):
-                         await db.execute('DELETE FROM processed_messages WHERE channel_id = ?', (donor_channel,))
+                    await db.execute('DELETE FROM processed_ranges WHERE channel_id = ?', (donor_channel,))
+                    await db.execute(
+                        'DELETE FROM processed_ranges WHERE channel_id = ?',
+                        (pair_delivery_key(donor_channel, pair_id),)
+                    )
 
             await db.execute('DELETE FROM channel_pairs WHERE id = ?', (pair_id,))
             await db.execute('DELETE FROM statistics WHERE pair_id = ?', (pair_id,))
+            await db.execute('DELETE FROM button_rules WHERE pair_id = ?', (pair_id,))
+            await db.execute('DELETE FROM scrape_checkpoints WHERE pair_id = ?', (pair_id,))
+            await db.execute('DELETE FROM scrape_jobs WHERE pair_id = ?', (pair_id,))
 
             async with db.execute('SELECT COUNT(1) FROM channel_pairs') as cursor:
                 row = await cursor.fetchone()
@@ -169,15 +928,24 @@ class Database:
                     await self._reset_sequences(db, ["channel_pairs", "statistics"])
 
             await db.commit()
-            return donor_channel
+        self.button_rules_version += 1
+        if donor_channel is not None:
+            self.processed_cache.invalidate(donor_channel)
+            self.processed_cache.invalidate(pair_delivery_key(donor_channel, pair_id))
+        return donor_channel
 
     async def clear_data(self, include_rules: bool = False):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('DELETE FROM processed_messages')
+        await self.flush()
+        async with self.pool.writer() as db:
+            await db.execute('DELETE FROM processed_ranges')
             await db.execute('DELETE FROM statistics')
             await db.execute('DELETE FROM channel_pairs')
+            # Pair ids start over, so per-pair button sets go with the pairs
+            await db.execute('DELETE FROM button_rules WHERE pair_id IS NOT NULL')
+            await db.execute('DELETE FROM scrape_checkpoints')
+            await db.execute('DELETE FROM scrape_jobs')
 
-            names = ["processed_messages", "statistics", "channel_pairs"]
+            names = ["statistics", "channel_pairs"]
 
             if include_rules:
                 await db.execute('DELETE FROM link_rules')
@@ -188,9 +956,14 @@ class Database:
 
             await self._reset_sequences(db, names)
             await db.commit()
+        if include_rules:
+            self.link_rules_version += 1
+        self.button_rules_version += 1
+        self.processed_cache.invalidate()
 
     async def reset_pair_progress(self, pair_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
+        await self.flush()
+        async with self.pool.writer() as db:
             donor_channel = None
             async with db.execute(
                 'SELECT donor_channel FROM channel_pairs WHERE id = ?',
@@ -202,19 +975,21 @@ class Database:
             if donor_channel is None:
                 return
             await db.execute(
-                'DELETE FROM processed_messages WHERE channel_id = ?',
-                (donor_channel,),
+                'DELETE FROM processed_ranges WHERE channel_id IN (?, ?)',
+                (donor_channel, pair_delivery_key(donor_channel, pair_id)),
             )
             await db.execute(
                 'UPDATE statistics SET posts_cloned = 0, last_cloned_at = NULL WHERE pair_id = ?',
                 (pair_id,),
             )
+            await db.execute('DELETE FROM scrape_checkpoints WHERE pair_id = ?', (pair_id,))
             await db.commit()
+        self.processed_cache.invalidate(donor_channel)
+        self.processed_cache.invalidate(pair_delivery_key(donor_channel, pair_id))
 
     async def get_all_pairs(self):
         """Get all channel pairs"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.reader() as db:
             async with db.execute('''
                 SELECT cp.*, s.posts_cloned, s.last_cloned_at
                 FROM channel_pairs cp
@@ -225,8 +1000,7 @@ class Database:
                 return [dict(row) for row in rows]
 
     async def get_pair_by_id(self, pair_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.reader() as db:
             async with db.execute(
                 '''
                 SELECT cp.*, s.posts_cloned, s.last_cloned_at
@@ -241,8 +1015,7 @@ class Database:
 
     async def get_pair_by_donor(self, donor_channel: str):
         """Get channel pair by donor channel"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.reader() as db:
             async with db.execute(
                 'SELECT * FROM channel_pairs WHERE donor_channel = ? AND enabled = 1',
                 (donor_channel,)
@@ -251,51 +1024,57 @@ class Database:
                 return dict(row) if row else None
 
     async def set_realtime_enabled(self, pair_id: int, enabled: bool):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute(
                 'UPDATE channel_pairs SET realtime_enabled = ? WHERE id = ?',
                 (1 if enabled else 0, pair_id),
             )
             await db.commit()
 
-    async def increment_statistics(self, pair_id: int):
-        """Increment post count for a channel pair"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''
-                UPDATE statistics 
-                SET posts_cloned = posts_cloned + 1,
-                    last_cloned_at = CURRENT_TIMESTAMP
-                WHERE pair_id = ?
-            ''', (pair_id,))
+    async def set_copy_mode(self, pair_id: int, enabled: bool):
+        async with self.pool.writer() as db:
+            await db.execute(
+                'UPDATE channel_pairs SET copy_mode = ? WHERE id = ?',
+                (1 if enabled else 0, pair_id),
+            )
             await db.commit()
 
+    async def increment_statistics(self, pair_id: int):
+        """Increment post count for a channel pair (committed by the next flush)"""
+        self.journal.add_stat(int(pair_id))
+        if self._after_journal_write():
+            await self.flush()
+
     async def add_link_rule(self, pattern: str, replacement: str):
         """Add a link replacement rule"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             cursor = await db.execute(
                 'INSERT INTO link_rules (pattern, replacement) VALUES (?, ?)',
                 (pattern, replacement)
             )
             await db.commit()
-            return cursor.lastrowid
+        self.link_rules_version += 1
+        return cursor.lastrowid
 
     async def remove_link_rule(self, rule_id: int):
         """Remove a link replacement rule"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute('DELETE FROM link_rules WHERE id = ?', (rule_id,))
             await db.commit()
+        self.link_rules_version += 1
 
     async def remove_link_rule_by_pattern(self, pattern: str):
         """Remove link replacement rules by exact pattern (case-insensitive)"""
         patt = (pattern or "").strip()
         if not patt:
             return 0
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute(
                 'DELETE FROM link_rules WHERE LOWER(pattern) = LOWER(?)',
                 (patt,)
             )
             await db.commit()
+            self.link_rules_version += 1
             # Return count removed
             async with db.execute(
                 'SELECT COUNT(1) FROM link_rules WHERE LOWER(pattern) = LOWER(?)',
@@ -306,10 +1085,9 @@ class Database:
 
     async def get_all_link_rules(self):
         """Get all enabled link replacement rules"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.reader() as db:
             async with db.execute(
-                'SELECT * FROM link_rules WHERE enabled = 1'
+                'SELECT * FROM link_rules WHERE enabled = 1 ORDER BY id ASC'
             ) as cursor:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
@@ -323,15 +1101,17 @@ class Database:
         url2: str | None = None,
         text3: str | None = None,
         url3: str | None = None,
+        pair_id: int | None = None,
     ):
-        async with aiosqlite.connect(self.db_path) as db:
-            # Clear existing rules first (system supports one global set for now)
-            await db.execute('DELETE FROM button_rules')
+        """Set the button set of a pair, or the global one when pair_id is None"""
+        async with self.pool.writer() as db:
+            # One set per scope: replace the existing rule
+            await db.execute('DELETE FROM button_rules WHERE pair_id IS ?', (pair_id,))
             
             cursor = await db.execute(
                 '''
-                INSERT INTO button_rules (mode, text1, url1, text2, url2, text3, url3)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO button_rules (mode, text1, url1, text2, url2, text3, url3, pair_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 ''',
                 (
                     mode,
@@ -341,38 +1121,46 @@ class Database:
                     url2,
                     text3,
                     url3,
+                    pair_id,
                 )
             )
             await db.commit()
-            return cursor.lastrowid
+        self.button_rules_version += 1
+        return cursor.lastrowid
 
     async def remove_button_rule(self, rule_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute('DELETE FROM button_rules WHERE id = ?', (rule_id,))
             await db.commit()
+        self.button_rules_version += 1
 
-    async def clear_button_rules(self):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('DELETE FROM button_rules')
-            await self._reset_sequences(db, ["button_rules"])
+    async def clear_button_rules(self, pair_id: int | None = None):
+        """Remove every button set, or only the set of one pair"""
+        async with self.pool.writer() as db:
+            if pair_id is None:
+                await db.execute('DELETE FROM button_rules')
+                await self._reset_sequences(db, ["button_rules"])
+            else:
+                await db.execute('DELETE FROM button_rules WHERE pair_id = ?', (pair_id,))
             await db.commit()
+        self.button_rules_version += 1
 
     async def clear_link_rules(self):
         """Clear all link rules and reset IDs"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute('DELETE FROM link_rules')
             await self._reset_sequences(db, ["link_rules"])
             await db.commit()
+        self.link_rules_version += 1
 
     async def reset_rules_ids(self):
         """Reset IDs for both button_rules and link_rules"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await self._reset_sequences(db, ["button_rules", "link_rules"])
             await db.commit()
 
     async def get_all_button_rules(self):
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.reader() as db:
             async with db.execute(
                 'SELECT * FROM button_rules WHERE enabled = 1 ORDER BY id ASC'
             ) as cursor:
@@ -381,31 +1169,123 @@ class Database:
 
     async def is_message_processed(self, channel_id: str, message_id: int) -> bool:
         """Check if a message has already been processed"""
-        async with aiosqlite.connect(self.db_path) as db:
+        if self.processed_cache.contains(str(channel_id), int(message_id)):
+            return True
+        if self.journal.has_mark(str(channel_id), int(message_id)):
+            return True
+        async with self.pool.reader() as db:
             async with db.execute(
-                'SELECT 1 FROM processed_messages WHERE channel_id = ? AND message_id = ?',
-                (str(channel_id), message_id)
+                '''
+                SELECT end_id FROM processed_ranges
+                WHERE channel_id = ? AND start_id <= ?
+                ORDER BY start_id DESC LIMIT 1
+                ''',
+                (str(channel_id), int(message_id))
             ) as cursor:
                 row = await cursor.fetchone()
-                return row is not None
+        processed = row is not None and row[0] >= int(message_id)
+        if processed:
+            self.processed_cache.add(str(channel_id), int(message_id))
+        return processed
+
+    async def clear_processed(self, channel_id: str, message_ids: list[int]):
+        """Remove message ids from a channel's processed ranges"""
+        # Pending marks have to be in the table to be removed
+        await self.flush()
+        channel_id = str(channel_id)
+        async with self.pool.writer() as db:
+            for start_id, end_id in _id_runs(int(mid) for mid in message_ids):
+                async with db.execute(
+                    '''
+                    SELECT start_id, end_id FROM processed_ranges
+                    WHERE channel_id = ? AND start_id <= ? AND end_id >= ?
+                    ''',
+                    (channel_id, end_id, start_id)
+                ) as cursor:
+                    rows = [tuple(row) for row in await cursor.fetchall()]
+                for range_start, range_end in rows:
+                    await db.execute(
+                        'DELETE FROM processed_ranges WHERE channel_id = ? AND start_id = ?',
+                        (channel_id, range_start)
+                    )
+                    # Keep the parts of the range outside [start_id, end_id]
+                    for piece_start, piece_end in ((range_start, start_id - 1), (end_id + 1, range_end)):
+                        if piece_start <= piece_end:
+                            await db.execute(
+                                'INSERT INTO processed_ranges (channel_id, start_id, end_id) VALUES (?, ?, ?)',
+                                (channel_id, piece_start, piece_end)
+                            )
+            await db.commit()
+        self.processed_cache.invalidate(channel_id)
+
+    async def filter_unprocessed(self, channel_id: str, message_ids: list[int]) -> list[int]:
+        """Return the ids from message_ids that are not processed yet (input order kept)"""
+        channel_id = str(channel_id)
+        cache = self.processed_cache
+        ids = [int(mid) for mid in message_ids]
+        ids = [
+            mid for mid in ids
+            if not cache.contains(channel_id, mid) and not self.journal.has_mark(channel_id, mid)
+        ]
+        if not ids:
+            return []
+        low, high = min(ids), max(ids)
+        async with self.pool.reader() as db:
+            # Only the ranges that can cover [low, high]
+            async with db.execute(
+                '''
+                SELECT start_id, end_id FROM processed_ranges
+                WHERE channel_id = ?
+                  AND start_id <= ?
+                  AND start_id >= COALESCE((
+                      SELECT start_id FROM processed_ranges
+                      WHERE channel_id = ? AND start_id <= ?
+                      ORDER BY start_id DESC LIMIT 1
+                  ), ?)
+                ORDER BY start_id
+                ''',
+                (channel_id, high, channel_id, low, low)
+            ) as cursor:
+                rows = await cursor.fetchall()
+
+        starts = [row[0] for row in rows]
+        ends = [row[1] for row in rows]
+        result = []
+        for mid in ids:
+            i = bisect.bisect_right(starts, mid) - 1
+            if i < 0 or ends[i] < mid:
+                result.append(mid)
+            else:
+                cache.add(channel_id, mid)
+        return result
+
+    async def get_high_water_mark(self, channel_id: str) -> int:
+        """Highest processed message id of a donor (0 if none); used by the realtime catch-up"""
+        # Marks still in the journal count too
+        await self.flush()
+        async with self.pool.reader() as db:
+            async with db.execute(
+                '''
+                SELECT end_id FROM processed_ranges
+                WHERE channel_id = ?
+                ORDER BY start_id DESC LIMIT 1
+                ''',
+                (str(channel_id),)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return int(row[0]) if row else 0
 
     async def mark_message_processed(self, channel_id: str, message_id: int):
-        """Mark a message as processed"""
-        async with aiosqlite.connect(self.db_path) as db:
-            try:
-                await db.execute(
-                    'INSERT INTO processed_messages (channel_id, message_id) VALUES (?, ?)',
-                    (str(channel_id), message_id)
-                )
-                await db.commit()
-            except aiosqlite.IntegrityError:
-                # Already exists, ignore
-                pass
+        """Mark a message as processed (committed by the next flush)"""
+        self.journal.add_mark(str(channel_id), int(message_id))
+        self.processed_cache.add(str(channel_id), int(message_id))
+        if self._after_journal_write():
+            await self.flush()
 
     async def get_statistics(self):
         """Get overall statistics"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        await self.flush()
+        async with self.pool.reader() as db:
             async with db.execute('''
                 SELECT 
                     cp.id,
@@ -1,13 +1,19 @@
 from pyrogram import Client, filters
+from pyrogram.errors import MessageNotModified
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from database import db
 from config import ADMIN_ID
 from handlers.scraper import (
     clear_memory_cache,
-    scrape_latest_n_messages,
-    scrape_full_history,
-    scrape_first_n_messages,
+    refresh_realtime_pairs,
+    SEARCH_FILTERS,
 )
+from handlers.scrape_jobs import scrape_scheduler
+from utils.media_handler import IN_MEMORY_TRANSFER_LIMIT, transfer_stats
+from utils.rate_limiter import rate_limiter
+from utils.peer_resolver import peer_resolver, normalize_chat_ref
+from utils.transcoder import transcode_stats
+from datetime import datetime
 import re
 import asyncio
 
@@ -21,23 +27,9 @@ def set_user_client(client: Client | None):
     _user_client = client
 
 
-def _normalize_chat_ref(chat_ref: str) -> str:
-    return (
-        str(chat_ref)
-        .strip()
-        .replace("−", "-")
-        .replace("–", "-")
-        .replace("—", "-")
-    )
-
-
 async def _resolve_chat_for_admin(client: Client, chat_ref: str):
-    ref = _normalize_chat_ref(chat_ref)
-    if ref.startswith("@"):
-        return await client.get_chat(ref)
-    if ref.startswith("-") or ref.isdigit():
-        return await client.get_chat(int(ref))
-    return await client.get_chat(f"@{ref}")
+    """Resolve through the shared peer cache (and its once-per-process dialog scan)"""
+    return await peer_resolver.resolve(client, chat_ref)
 
 
 def _t(lang: str, key: str) -> str:
@@ -80,6 +72,9 @@ def _t(lang: str, key: str) -> str:
                                          "`/addbtn2 t1|u1 || t2|u2` — установить 2 кнопки\n"
                                          "`/addbtn3 t1|u1 || t2|u2 || t3|u3` — установить 3 кнопки\n"
                                          "`/removebtn` — удалить все кнопки\n\n"
+                                         "Чтобы задать кнопки только для одной пары, добавьте `pair:<id>` после команды, "
+                                         "например `/addbtn1 pair:2 текст|url` или `/removebtn pair:2`. "
+                                         "Пары без своих кнопок используют общие.\n\n"
                                          "**Максимум можно добавить 3 кнопки!**",
             "label_custom_mode": "Режим 'Свои кнопки'",
             "btn_custom_mode_on": "🚀 Свои кнопки: ВКЛ",
@@ -91,9 +86,11 @@ def _t(lang: str, key: str) -> str:
             "addbtn1_usage": "**Использование:** `/addbtn1 текст|url`",
             "addbtn2_usage": "**Использование:** `/addbtn2 t1|u1 || t2|u2`",
             "addbtn3_usage": "**Использование:** `/addbtn3 t1|u1 || t2|u2 || t3|u3`",
-            "removebtn_usage": "**Использование:** `/removebtn`",
+            "removebtn_usage": "**Использование:** `/removebtn` или `/removebtn pair:<id>`",
             "button_rule_added": "✅ Настройки кнопок обновлены!",
             "button_rule_removed": "✅ Все кнопки удалены!",
+            "button_rule_removed_pair": "✅ Кнопки пары {pair_id} удалены!",
+            "label_pair_buttons": "Кнопки пары {pair_id}",
             "button_rule_invalid": "❌ Ошибка в формате. Проверь палочки `|` и `||`.",
             "label_pair_id": "ID пары",
             "label_donor": "Донор",
@@ -101,6 +98,13 @@ def _t(lang: str, key: str) -> str:
             "label_posts_cloned": "Постов",
             "label_last_cloned": "Последний",
             "label_total_posts": "Всего постов",
+            "label_memory_limit": "Передача через память",
+            "label_transfers": "Файлов через память / через диск",
+            "memory_limit_value": "до {mb} МБ",
+            "label_send_wait": "Ожидание в очереди отправки",
+            "seconds_value": "{s} с",
+            "label_transcodes": "Конвертации видео-кружков",
+            "transcodes_value": "{jobs} (ошибок: {failed}), в среднем {avg} с, последняя {last} с, максимум {max} с",
             "label_rule_id": "ID правила",
             "label_pattern": "Шаблон",
             "label_replacement": "Замена",
@@ -139,22 +143,50 @@ def _t(lang: str, key: str) -> str:
             "scrape_modes_help": "Режимы:\n"
                                 "• Скрап N последних постов — берёт последние {n} сообщений.\n"
                                 "• Скрап N первых постов — берёт самые старые {n} сообщений, которые ещё не скрапились.\n"
+                                "• Скрап за период — только посты, опубликованные между двумя датами.\n"
+                                "• Скрап по фильтру — только посты нужного типа (видео, фото…) или с ключевым словом.\n"
                                 "• Полный скрап — проходит по всей истории и добавляет все ещё не скрапленные посты.\n\n",
             "scrape_bot_admin_note": "Важно: бот должен быть администратором в целевом канале, иначе он не сможет публиковать посты.\n\n",
             "btn_scrape_latest": "▶️ Скрап N последних постов",
             "btn_scrape_first": "⏮️ Скрап N первых постов",
             "btn_scrape_full": "📥 Полный скрап",
+            "btn_scrape_range": "📅 Скрап за период",
+            "scrape_range_help": "**📅 Скрап за период для пары {pair_id}**\n\n"
+                                 "Отправьте команду:\n`/scrapedates {pair_id} <с> <по>`\n\n"
+                                 "Даты в формате `ГГГГ-ММ-ДД`, оба дня включаются.\n"
+                                 "Пример: `/scrapedates {pair_id} 2024-03-01 2024-03-15`",
+            "scrape_range_usage": "**Использование:** `/scrapedates <pair_id> <ГГГГ-ММ-ДД> <ГГГГ-ММ-ДД>`",
+            "scrape_range_invalid": "❌ Неверные даты. Формат `ГГГГ-ММ-ДД`, начальная дата не позже конечной.",
+            "scrape_started_range": "Скрап постов с {date_from} по {date_to} для пары {pair_id} поставлен в очередь (задача #{job_id}).",
+            "job_kind_range": "{date_from} — {date_to}",
+            "btn_scrape_filter": "🔎 Скрап по фильтру",
+            "scrape_filter_help": "**🔎 Скрап по фильтру для пары {pair_id}**\n\n"
+                                  "Поиск выполняет Telegram, поэтому остальные сообщения не загружаются.\n\n"
+                                  "Отправьте команду:\n`/scrapefilter {pair_id} <фильтр> [слово]`\n\n"
+                                  "Фильтры: {filters}\n"
+                                  "`all` — любые посты, тогда слово обязательно.\n\n"
+                                  "Примеры:\n`/scrapefilter {pair_id} video`\n`/scrapefilter {pair_id} all розыгрыш`",
+            "scrape_filter_usage": "**Использование:** `/scrapefilter <pair_id> <фильтр> [слово]`\n\nФильтры: {filters}",
+            "scrape_filter_need_query": "❌ С фильтром `all` нужно указать слово для поиска.",
+            "scrape_started_filter": "Скрап по фильтру `{filter}` {query} для пары {pair_id} поставлен в очередь (задача #{job_id}).",
+            "job_kind_filter": "фильтр {filter} {query}",
             "btn_scrape_realtime_on": "🔄 Скрап в реальном времени: Включён",
             "btn_scrape_realtime_off": "🔄 Скрап в реальном времени: Выключен",
             "scrape_full_confirm": "Вы уверены, что хотите запустить полный скрап для этой пары?\nЭто может занять время при большом количестве постов.",
-            "scrape_started_latest": "Запущен скрап {n} последних постов для пары {pair_id}.",
-            "scrape_started_first": "Запущен скрап {n} первых постов для пары {pair_id}.",
-            "scrape_started_full": "Запущен полный скрап для пары {pair_id}.\n\n"
+            "scrape_started_latest": "Скрап {n} последних постов для пары {pair_id} поставлен в очередь (задача #{job_id}).",
+            "scrape_started_first": "Скрап {n} первых постов для пары {pair_id} поставлен в очередь (задача #{job_id}).",
+            "scrape_started_full": "Полный скрап для пары {pair_id} поставлен в очередь (задача #{job_id}).\n\n"
                                    "После завершения вы можете включить режим скрапа в реальном "
                                    "времени кнопкой ниже.",
             "scrape_no_pair": "Пара не найдена.",
             "realtime_enabled": "Режим скрапа в реальном времени включён для пары {pair_id}.",
             "realtime_disabled": "Режим скрапа в реальном времени выключен для пары {pair_id}.",
+            "btn_copy_mode_on": "📋 Копирование без скачивания: Включено",
+            "btn_copy_mode_off": "📋 Копирование без скачивания: Выключено",
+            "copy_mode_enabled": "Копирование без скачивания включено для пары {pair_id}.\n\n"
+                                 "Если скопировать пост нельзя (защищённый контент или у бота нет доступа к донору), "
+                                 "он будет скачан и загружен заново.",
+            "copy_mode_disabled": "Копирование без скачивания выключено для пары {pair_id}.",
             "scrape_choose_n_latest": "**▶️ Скрап последних постов**\n\nВыберите, сколько последних сообщений скрапить:",
             "scrape_choose_n_first": "**⏮️ Скрап первых постов**\n\nВыберите, сколько самых старых сообщений скрапить:",
             "btn_scrape_n_10": "10",
@@ -163,6 +195,27 @@ def _t(lang: str, key: str) -> str:
             "btn_scrape_n_100": "100",
             "btn_scrape_reset": "♻️ Сбросить прогресс скрапа",
             "scrape_reset_done": "Прогресс скрапа и счётчик постов для пары {pair_id} сброшены. Можно скрапить заново.",
+            "scrape_job_exists": "Такой скрап для пары {pair_id} уже в очереди (задача #{job_id}).",
+            "btn_scrape_jobs": "🗂 Очередь скрапа",
+            "scrape_jobs_title": "**🗂 Очередь скрапа**\n\n",
+            "scrape_jobs_workers": "Одновременно выполняется до {workers} задач, для одной пары — по одной.\n\n",
+            "scrape_jobs_empty": "Очередь пуста.",
+            "scrape_job_line": "**#{job_id}** · пара {pair_id} · {kind} · {status} · приоритет {priority}\n",
+            "job_kind_latest": "последние {limit}",
+            "job_kind_first": "первые {limit}",
+            "job_kind_full": "полный",
+            "job_status_queued": "⏳ в очереди",
+            "job_status_running": "▶️ выполняется",
+            "job_status_paused": "⏸ на паузе",
+            "btn_job_pause": "⏸ #{job_id}",
+            "btn_job_resume": "▶️ #{job_id}",
+            "btn_job_cancel": "✖️ #{job_id}",
+            "btn_refresh": "🔄 Обновить",
+            "job_paused": "Задача #{job_id} поставлена на паузу.",
+            "job_resumed": "Задача #{job_id} снова в очереди.",
+            "job_cancelled": "Задача #{job_id} отменена.",
+            "job_pause_failed": "Задачу #{job_id} нельзя поставить на паузу: короткие скрапы во время выполнения можно только отменить.",
+            "job_not_found": "Задача #{job_id} не найдена.",
             "btn_link_rules": "🧮 Замена ключевых слов",
             "link_rules_title": "**🧮 Замена ключевых слов**\n\n",
             "link_rules_none": "Правила ещё не настроены.\n\n",
@@ -217,6 +270,9 @@ def _t(lang: str, key: str) -> str:
                                          "`/addbtn2 t1|u1 || t2|u2` — set 2 buttons\n"
                                          "`/addbtn3 t1|u1 || t2|u2 || t3|u3` — set 3 buttons\n"
                                          "`/removebtn` — delete all buttons\n\n"
+                                         "To set buttons for one pair only, add `pair:<id>` after the command, "
+                                         "e.g. `/addbtn1 pair:2 text|url` or `/removebtn pair:2`. "
+                                         "Pairs without their own buttons use the global ones.\n\n"
                                          "**Maximum of 3 buttons allowed!**",
             "label_custom_mode": "Custom Buttons Mode",
             "btn_custom_mode_on": "🚀 Custom Mode: ON",
@@ -228,9 +284,11 @@ def _t(lang: str, key: str) -> str:
             "addbtn1_usage": "**Usage:** `/addbtn1 text|url`",
             "addbtn2_usage": "**Usage:** `/addbtn2 t1|u1 || t2|u2`",
             "addbtn3_usage": "**Usage:** `/addbtn3 t1|u1 || t2|u2 || t3|u3`",
-            "removebtn_usage": "**Usage:** `/removebtn`",
+            "removebtn_usage": "**Usage:** `/removebtn` or `/removebtn pair:<id>`",
             "button_rule_added": "✅ Button settings updated!",
             "button_rule_removed": "✅ All buttons removed!",
+            "button_rule_removed_pair": "✅ Buttons of pair {pair_id} removed!",
+            "label_pair_buttons": "Buttons of pair {pair_id}",
             "button_rule_invalid": "❌ Invalid format. Check `|` and `||` separators.",
             "label_pair_id": "Pair ID",
             "label_donor": "Donor",
@@ -238,6 +296,13 @@ def _t(lang: str, key: str) -> str:
             "label_posts_cloned": "Posts",
             "label_last_cloned": "Last",
             "label_total_posts": "Total posts",
+            "label_memory_limit": "In-memory transfer",
+            "label_transfers": "Files via memory / via disk",
+            "memory_limit_value": "up to {mb} MB",
+            "label_send_wait": "Send queue wait",
+            "seconds_value": "{s} s",
+            "label_transcodes": "Video note conversions",
+            "transcodes_value": "{jobs} (failed: {failed}), avg {avg} s, last {last} s, max {max} s",
             "label_rule_id": "Rule ID",
             "label_pattern": "Pattern",
             "label_replacement": "Replacement",
@@ -263,22 +328,50 @@ def _t(lang: str, key: str) -> str:
             "scrape_modes_help": "Modes:\n"
                                 "• Scrape N latest posts — takes the last {n} messages.\n"
                                 "• Scrape N first posts — takes the oldest {n} messages that were not scraped yet.\n"
+                                "• Scrape a date range — only the posts published between two dates.\n"
+                                "• Filtered scrape — only posts of one type (videos, photos…) or with a keyword.\n"
                                 "• Full scrape — walks through the entire history and adds all not yet scraped posts.\n\n",
             "scrape_bot_admin_note": "Important: the bot must be an admin in the target channel, otherwise it cannot send posts.\n\n",
             "btn_scrape_latest": "▶️ Scrape N latest posts",
             "btn_scrape_first": "⏮️ Scrape N first posts",
             "btn_scrape_full": "📥 Full scrape",
+            "btn_scrape_range": "📅 Scrape a date range",
+            "scrape_range_help": "**📅 Date range scrape for pair {pair_id}**\n\n"
+                                 "Send the command:\n`/scrapedates {pair_id} <from> <to>`\n\n"
+                                 "Dates are `YYYY-MM-DD`, both days are included.\n"
+                                 "Example: `/scrapedates {pair_id} 2024-03-01 2024-03-15`",
+            "scrape_range_usage": "**Usage:** `/scrapedates <pair_id> <YYYY-MM-DD> <YYYY-MM-DD>`",
+            "scrape_range_invalid": "❌ Invalid dates. Use `YYYY-MM-DD`, the start date must not be after the end date.",
+            "scrape_started_range": "Scrape of posts from {date_from} to {date_to} for pair {pair_id} is queued (job #{job_id}).",
+            "job_kind_range": "{date_from} — {date_to}",
+            "btn_scrape_filter": "🔎 Filtered scrape",
+            "scrape_filter_help": "**🔎 Filtered scrape for pair {pair_id}**\n\n"
+                                  "Telegram does the search, so other messages are never downloaded.\n\n"
+                                  "Send the command:\n`/scrapefilter {pair_id} <filter> [keyword]`\n\n"
+                                  "Filters: {filters}\n"
+                                  "`all` — any post, a keyword is required then.\n\n"
+                                  "Examples:\n`/scrapefilter {pair_id} video`\n`/scrapefilter {pair_id} all giveaway`",
+            "scrape_filter_usage": "**Usage:** `/scrapefilter <pair_id> <filter> [keyword]`\n\nFilters: {filters}",
+            "scrape_filter_need_query": "❌ The `all` filter needs a keyword to search for.",
+            "scrape_started_filter": "Filtered scrape `{filter}` {query} for pair {pair_id} is queued (job #{job_id}).",
+            "job_kind_filter": "filter {filter} {query}",
             "btn_scrape_realtime_on": "🔄 Realtime scraping: Enabled",
             "btn_scrape_realtime_off": "🔄 Realtime scraping: Disabled",
             "scrape_full_confirm": "Are you sure you want to start a full scrape for this pair?\nThis may take time for large channels.",
-            "scrape_started_latest": "Started scraping {n} latest posts for pair {pair_id}.",
-            "scrape_started_first": "Started scraping {n} first posts for pair {pair_id}.",
-            "scrape_started_full": "Started full scrape for pair {pair_id}.\n\n"
+            "scrape_started_latest": "Scrape of {n} latest posts for pair {pair_id} is queued (job #{job_id}).",
+            "scrape_started_first": "Scrape of {n} first posts for pair {pair_id} is queued (job #{job_id}).",
+            "scrape_started_full": "Full scrape for pair {pair_id} is queued (job #{job_id}).\n\n"
                                    "When it finishes you can enable realtime scraping using the "
                                    "button below.",
             "scrape_no_pair": "Channel pair not found.",
             "realtime_enabled": "Realtime scraping mode enabled for pair {pair_id}.",
             "realtime_disabled": "Realtime scraping mode disabled for pair {pair_id}.",
+            "btn_copy_mode_on": "📋 Copy without download: Enabled",
+            "btn_copy_mode_off": "📋 Copy without download: Disabled",
+            "copy_mode_enabled": "Copy without download enabled for pair {pair_id}.\n\n"
+                                 "Posts that cannot be copied (protected content, or the bot cannot read the donor) "
+                                 "are downloaded and uploaded again.",
+            "copy_mode_disabled": "Copy without download disabled for pair {pair_id}.",
             "scrape_choose_n_latest": "**▶️ Scrape latest posts**\n\nChoose how many latest messages to scrape:",
             "scrape_choose_n_first": "**⏮️ Scrape first posts**\n\nChoose how many oldest messages to scrape:",
             "btn_scrape_n_10": "10",
@@ -287,6 +380,27 @@ def _t(lang: str, key: str) -> str:
             "btn_scrape_n_100": "100",
             "btn_scrape_reset": "♻️ Reset scrape progress",
             "scrape_reset_done": "Scrape progress and post counter for pair {pair_id} have been reset. You can scrape again.",
+            "scrape_job_exists": "This scrape for pair {pair_id} is already queued (job #{job_id}).",
+            "btn_scrape_jobs": "🗂 Scrape queue",
+            "scrape_jobs_title": "**🗂 Scrape queue**\n\n",
+            "scrape_jobs_workers": "Up to {workers} jobs run at once, one per pair.\n\n",
+            "scrape_jobs_empty": "The queue is empty.",
+            "scrape_job_line": "**#{job_id}** · pair {pair_id} · {kind} · {status} · priority {priority}\n",
+            "job_kind_latest": "latest {limit}",
+            "job_kind_first": "first {limit}",
+            "job_kind_full": "full",
+            "job_status_queued": "⏳ queued",
+            "job_status_running": "▶️ running",
+            "job_status_paused": "⏸ paused",
+            "btn_job_pause": "⏸ #{job_id}",
+            "btn_job_resume": "▶️ #{job_id}",
+            "btn_job_cancel": "✖️ #{job_id}",
+            "btn_refresh": "🔄 Refresh",
+            "job_paused": "Job #{job_id} paused.",
+            "job_resumed": "Job #{job_id} is queued again.",
+            "job_cancelled": "Job #{job_id} cancelled.",
+            "job_pause_failed": "Job #{job_id} cannot be paused: short scrapes can only be cancelled while running.",
+            "job_not_found": "Job #{job_id} not found.",
             "btn_link_rules": "🧮 Keyword replacement",
             "link_rules_title": "**🧮 Keyword / link replacement**\n\n",
             "link_rules_none": "No rules configured yet.\n\n",
@@ -345,7 +459,7 @@ async def _pair_access_report(bot_client: Client, donor: str, target: str) -> st
     # 1. Check Donor Access (User side)
     try:
         resolver = _user_client or bot_client
-        chat_obj = await resolver.get_chat(normalize(donor))
+        chat_obj = await _resolve_chat_for_admin(resolver, donor)
         _ = chat_obj.id
     except Exception as e:
         donor_status = "❌"
@@ -363,8 +477,8 @@ async def _pair_access_report(bot_client: Client, donor: str, target: str) -> st
             # If bot fails and we have a user client, try to resolve via user
             if _user_client:
                 try:
-                    # User resolves by ID
-                    user_side_chat = await _user_client.get_chat(target_ref)
+                    # User resolves by ID (cached id and username)
+                    user_side_chat = await peer_resolver.resolve(_user_client, target_ref)
                     if user_side_chat.username:
                         # Bot resolves by username -> caches access hash
                         target_chat = await bot_client.get_chat(user_side_chat.username)
@@ -468,7 +582,20 @@ async def handle_admin_stats(client: Client, callback_query):
         text += "\n"
         total_posts += stat['posts_cloned']
     
-    text += f"**{_t(lang, 'label_total_posts')}:** {total_posts}"
+    text += f"**{_t(lang, 'label_total_posts')}:** {total_posts}\n\n"
+
+    limit_mb = round(IN_MEMORY_TRANSFER_LIMIT / (1024 * 1024), 1)
+    text += f"**{_t(lang, 'label_memory_limit')}:** {_t(lang, 'memory_limit_value').format(mb=f'{limit_mb:g}')}\n"
+    text += f"**{_t(lang, 'label_transfers')}:** {transfer_stats['in_memory']} / {transfer_stats['on_disk']}\n"
+    text += f"**{_t(lang, 'label_send_wait')}:** {_t(lang, 'seconds_value').format(s=f'{rate_limiter.wait_time():.1f}')}\n"
+    jobs = transcode_stats["jobs"]
+    text += f"**{_t(lang, 'label_transcodes')}:** " + _t(lang, "transcodes_value").format(
+        jobs=jobs,
+        failed=transcode_stats["failed"],
+        avg=f"{(transcode_stats['total_seconds'] / jobs if jobs else 0):.1f}",
+        last=f"{transcode_stats['last_seconds']:.1f}",
+        max=f"{transcode_stats['max_seconds']:.1f}",
+    )
     
     keyboard = InlineKeyboardMarkup([
         [InlineKeyboardButton(_t(await _get_lang_from_callback(callback_query), "btn_back"), callback_data="admin_menu")]
@@ -501,6 +628,9 @@ async def handle_scrape_menu(client: Client, callback_query):
                     callback_data=f"admin_scrape_pair:{pair['id']}",
                 )
             ])
+        keyboard_rows.append(
+            [InlineKeyboardButton(_t(lang, "btn_scrape_jobs"), callback_data="admin_scrape_jobs")]
+        )
         keyboard_rows.append(
             [InlineKeyboardButton(_t(lang, "btn_back"), callback_data="admin_menu")]
         )
@@ -536,6 +666,11 @@ async def handle_scrape_pair(client: Client, callback_query, pair_id: int):
     else:
         realtime_button_text = _t(lang, "btn_scrape_realtime_off")
 
+    if pair.get("copy_mode"):
+        copy_button_text = _t(lang, "btn_copy_mode_on")
+    else:
+        copy_button_text = _t(lang, "btn_copy_mode_off")
+
     keyboard = InlineKeyboardMarkup([
         [
             InlineKeyboardButton(
@@ -549,6 +684,18 @@ async def handle_scrape_pair(client: Client, callback_query, pair_id: int):
                 callback_data=f"admin_scrape_first_choose:{pair_id}",
             )
         ],
+        [
+            InlineKeyboardButton(
+                _t(lang, "btn_scrape_range"),
+                callback_data=f"admin_scrape_range:{pair_id}",
+            )
+        ],
+        [
+            InlineKeyboardButton(
+                _t(lang, "btn_scrape_filter"),
+                callback_data=f"admin_scrape_filter:{pair_id}",
+            )
+        ],
         [
             InlineKeyboardButton(
                 _t(lang, "btn_scrape_full"),
@@ -567,6 +714,12 @@ async def handle_scrape_pair(client: Client, callback_query, pair_id: int):
                 callback_data=f"admin_scrape_realtime_toggle:{pair_id}",
             )
         ],
+        [
+            InlineKeyboardButton(
+                copy_button_text,
+                callback_data=f"admin_scrape_copy_toggle:{pair_id}",
+            )
+        ],
         [
             InlineKeyboardButton(_t(lang, "btn_back"), callback_data="admin_scrape_menu")
         ],
@@ -581,25 +734,34 @@ async def handle_button_rules(client: Client, callback_query):
     text = _t(lang, "button_rules_title")
     text += _t(lang, "button_rules_instructions") + "\n\n"
 
+    def _format_buttons(rule):
+        mode = (rule.get('mode') or 'one').lower()
+        lines = f"**{_t(lang, 'label_mode')}**: `{mode}`\n\n"
+        lines += f"1️⃣ `{rule.get('text1') or ''}` | `{rule.get('url1') or ''}`\n"
+        if mode in ['two', 'three']:
+            lines += f"2️⃣ `{rule.get('text2') or ''}` | `{rule.get('url2') or ''}`\n"
+        if mode == 'three':
+            lines += f"3️⃣ `{rule.get('text3') or ''}` | `{rule.get('url3') or ''}`\n"
+        return lines + "\n"
+
+    global_rules = [r for r in rules if r.get('pair_id') is None]
+    pair_rules = [r for r in rules if r.get('pair_id') is not None]
+
     custom_mode = False
-    if rules:
-        rule = rules[0]
+    if global_rules:
+        rule = global_rules[0]
         custom_mode = bool(rule.get('custom_buttons_mode', 0))
-        mode = (rule.get('mode') or 'one').lower()
         
         status_icon = "🚀" if custom_mode else "📄"
         text += f"**{_t(lang, 'label_custom_mode')}**: {'✅ ВКЛ' if custom_mode else '❌ ВЫКЛ'}\n"
-        text += f"**{_t(lang, 'label_mode')}**: `{mode}`\n\n"
-        
-        text += f"1️⃣ `{rule.get('text1') or ''}` | `{rule.get('url1') or ''}`\n"
-        if mode in ['two', 'three']:
-            text += f"2️⃣ `{rule.get('text2') or ''}` | `{rule.get('url2') or ''}`\n"
-        if mode == 'three':
-            text += f"3️⃣ `{rule.get('text3') or ''}` | `{rule.get('url3') or ''}`\n"
-        text += "\n"
-    else:
+        text += _format_buttons(rule)
+    elif not pair_rules:
         text += _t(lang, "button_rules_none")
 
+    for rule in pair_rules:
+        text += f"**{_t(lang, 'label_pair_buttons').format(pair_id=rule['pair_id'])}**\n"
+        text += _format_buttons(rule)
+
     keyboard = InlineKeyboardMarkup([
         [
             InlineKeyboardButton(
@@ -746,13 +908,12 @@ async def handle_scrape_latest(client: Client, callback_query):
         await callback_query.answer(report, show_alert=True)
         return
 
-    worker_client = _user_client or client
-    asyncio.create_task(scrape_latest_n_messages(worker_client, pair_id, n))
-
-    await callback_query.answer(
-        _t(lang, "scrape_started_latest").format(n=n, pair_id=pair_id),
-        show_alert=True,
-    )
+    job_id, created = await scrape_scheduler.submit(pair_id, "latest", {"limit": n})
+    if created:
+        text = _t(lang, "scrape_started_latest").format(n=n, pair_id=pair_id, job_id=job_id)
+    else:
+        text = _t(lang, "scrape_job_exists").format(pair_id=pair_id, job_id=job_id)
+    await callback_query.answer(text, show_alert=True)
     await handle_scrape_pair(client, callback_query, pair_id)
 
 
@@ -775,14 +936,87 @@ async def handle_scrape_first(client: Client, callback_query):
         await callback_query.answer(report, show_alert=True)
         return
 
-    worker_client = _user_client or client
-    asyncio.create_task(scrape_first_n_messages(worker_client, pair_id, n))
+    job_id, created = await scrape_scheduler.submit(pair_id, "first", {"limit": n})
+    if created:
+        text = _t(lang, "scrape_started_first").format(n=n, pair_id=pair_id, job_id=job_id)
+    else:
+        text = _t(lang, "scrape_job_exists").format(pair_id=pair_id, job_id=job_id)
+    await callback_query.answer(text, show_alert=True)
+    await handle_scrape_pair(client, callback_query, pair_id)
 
-    await callback_query.answer(
-        _t(lang, "scrape_started_first").format(n=n, pair_id=pair_id),
-        show_alert=True,
+
+async def handle_scrape_jobs(client: Client, callback_query):
+    lang = await _get_lang_from_callback(callback_query)
+    jobs = await db.get_scrape_jobs()
+
+    text = _t(lang, "scrape_jobs_title")
+    text += _t(lang, "scrape_jobs_workers").format(workers=scrape_scheduler.workers)
+    if not jobs:
+        text += _t(lang, "scrape_jobs_empty")
+
+    keyboard_rows = []
+    for job in jobs:
+        kind = _t(lang, f"job_kind_{job['kind']}").format(**job["params"]).strip()
+        text += _t(lang, "scrape_job_line").format(
+            job_id=job["id"],
+            pair_id=job["pair_id"],
+            kind=kind,
+            status=_t(lang, f"job_status_{job['status']}"),
+            priority=job["priority"],
+        )
+        if job["status"] == "paused":
+            toggle = InlineKeyboardButton(
+                _t(lang, "btn_job_resume").format(job_id=job["id"]),
+                callback_data=f"admin_job_resume:{job['id']}",
+            )
+        else:
+            toggle = InlineKeyboardButton(
+                _t(lang, "btn_job_pause").format(job_id=job["id"]),
+                callback_data=f"admin_job_pause:{job['id']}",
+            )
+        keyboard_rows.append([
+            toggle,
+            InlineKeyboardButton(
+                _t(lang, "btn_job_cancel").format(job_id=job["id"]),
+                callback_data=f"admin_job_cancel:{job['id']}",
+            ),
+        ])
+    keyboard_rows.append(
+        [InlineKeyboardButton(_t(lang, "btn_refresh"), callback_data="admin_scrape_jobs")]
+    )
+    keyboard_rows.append(
+        [InlineKeyboardButton(_t(lang, "btn_back"), callback_data="admin_scrape_menu")]
     )
-    await handle_scrape_pair(client, callback_query, pair_id)
+
+    try:
+        await callback_query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard_rows))
+    except MessageNotModified:
+        pass
+
+
+async def handle_scrape_job_action(client: Client, callback_query):
+    lang = await _get_lang_from_callback(callback_query)
+    try:
+        action, job_part = callback_query.data.split(":", 1)
+        job_id = int(job_part)
+    except Exception:
+        await callback_query.answer()
+        return
+
+    if not await db.get_scrape_job(job_id):
+        done, key = False, "job_not_found"
+    elif action == "admin_job_pause":
+        done = await scrape_scheduler.pause(job_id)
+        key = "job_paused" if done else "job_pause_failed"
+    elif action == "admin_job_resume":
+        done = await scrape_scheduler.resume(job_id)
+        key = "job_resumed" if done else "job_not_found"
+    else:
+        done = await scrape_scheduler.cancel(job_id)
+        key = "job_cancelled" if done else "job_not_found"
+
+    await callback_query.answer(_t(lang, key).format(job_id=job_id), show_alert=not done)
+    await handle_scrape_jobs(client, callback_query)
 
 
 async def handle_scrape_latest_choose(client: Client, callback_query):
@@ -877,6 +1111,50 @@ async def handle_scrape_first_choose(client: Client, callback_query):
     await callback_query.edit_message_text(text, reply_markup=keyboard)
 
 
+async def handle_scrape_range(client: Client, callback_query):
+    lang = await _get_lang_from_callback(callback_query)
+    try:
+        pair_id = int(callback_query.data.split(":", 1)[1])
+    except Exception:
+        await callback_query.answer(_t(lang, "scrape_no_pair"), show_alert=True)
+        return
+
+    keyboard = InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton(
+                _t(lang, "btn_back"),
+                callback_data=f"admin_scrape_pair:{pair_id}",
+            )
+        ],
+    ])
+    await callback_query.edit_message_text(
+        _t(lang, "scrape_range_help").format(pair_id=pair_id),
+        reply_markup=keyboard,
+    )
+
+
+async def handle_scrape_filter(client: Client, callback_query):
+    lang = await _get_lang_from_callback(callback_query)
+    try:
+        pair_id = int(callback_query.data.split(":", 1)[1])
+    except Exception:
+        await callback_query.answer(_t(lang, "scrape_no_pair"), show_alert=True)
+        return
+
+    keyboard = InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton(
+                _t(lang, "btn_back"),
+                callback_data=f"admin_scrape_pair:{pair_id}",
+            )
+        ],
+    ])
+    await callback_query.edit_message_text(
+        _t(lang, "scrape_filter_help").format(pair_id=pair_id, filters=_search_filter_names()),
+        reply_markup=keyboard,
+    )
+
+
 async def handle_scrape_full_confirm(client: Client, callback_query):
     lang = await _get_lang_from_callback(callback_query)
     try:
@@ -920,13 +1198,12 @@ async def handle_scrape_full(client: Client, callback_query):
         await callback_query.answer(report, show_alert=True)
         return
 
-    worker_client = _user_client or client
-    asyncio.create_task(scrape_full_history(worker_client, pair_id))
-
-    await callback_query.answer(
-        _t(lang, "scrape_started_full").format(pair_id=pair_id),
-        show_alert=True,
-    )
+    job_id, created = await scrape_scheduler.submit(pair_id, "full")
+    if created:
+        text = _t(lang, "scrape_started_full").format(pair_id=pair_id, job_id=job_id)
+    else:
+        text = _t(lang, "scrape_job_exists").format(pair_id=pair_id, job_id=job_id)
+    await callback_query.answer(text, show_alert=True)
     await handle_scrape_pair(client, callback_query, pair_id)
 
 
@@ -946,6 +1223,7 @@ async def handle_scrape_realtime_toggle(client: Client, callback_query):
     current = bool(pair.get("realtime_enabled"))
     new_value = not current
     await db.set_realtime_enabled(pair_id, new_value)
+    asyncio.create_task(refresh_realtime_pairs())
 
     if new_value:
         await callback_query.answer(
@@ -961,6 +1239,31 @@ async def handle_scrape_realtime_toggle(client: Client, callback_query):
     await handle_scrape_pair(client, callback_query, pair_id)
 
 
+async def handle_scrape_copy_toggle(client: Client, callback_query):
+    lang = await _get_lang_from_callback(callback_query)
+    try:
+        pair_id = int(callback_query.data.split(":", 1)[1])
+    except Exception:
+        await callback_query.answer(_t(lang, "scrape_no_pair"), show_alert=True)
+        return
+
+    pair = await db.get_pair_by_id(pair_id)
+    if not pair:
+        await callback_query.answer(_t(lang, "scrape_no_pair"), show_alert=True)
+        return
+
+    new_value = not bool(pair.get("copy_mode"))
+    await db.set_copy_mode(pair_id, new_value)
+    # Realtime routes carry the pair settings
+    asyncio.create_task(refresh_realtime_pairs())
+
+    await callback_query.answer(
+        _t(lang, "copy_mode_enabled" if new_value else "copy_mode_disabled").format(pair_id=pair_id),
+        show_alert=True,
+    )
+    await handle_scrape_pair(client, callback_query, pair_id)
+
+
 async def handle_scrape_reset(client: Client, callback_query):
     lang = await _get_lang_from_callback(callback_query)
     try:
@@ -1044,12 +1347,25 @@ async def handle_admin_menu_callback(client: Client, callback_query):
             await handle_scrape_latest_choose(client, callback_query)
         elif data.startswith("admin_scrape_first_choose:"):
             await handle_scrape_first_choose(client, callback_query)
+        elif data.startswith("admin_scrape_range:"):
+            await handle_scrape_range(client, callback_query)
+            await callback_query.answer()
+        elif data.startswith("admin_scrape_filter:"):
+            await handle_scrape_filter(client, callback_query)
+            await callback_query.answer()
         elif data.startswith("admin_scrape_full_confirm:"):
             await handle_scrape_full_confirm(client, callback_query)
         elif data.startswith("admin_scrape_full:"):
             await handle_scrape_full(client, callback_query)
+        elif data == "admin_scrape_jobs":
+            await handle_scrape_jobs(client, callback_query)
+            await callback_query.answer()
+        elif data.startswith(("admin_job_pause:", "admin_job_resume:", "admin_job_cancel:")):
+            await handle_scrape_job_action(client, callback_query)
         elif data.startswith("admin_scrape_realtime_toggle:"):
             await handle_scrape_realtime_toggle(client, callback_query)
+        elif data.startswith("admin_scrape_copy_toggle:"):
+            await handle_scrape_copy_toggle(client, callback_query)
         elif data.startswith("admin_scrape_reset:"):
             await handle_scrape_reset(client, callback_query)
         elif data == "admin_language":
@@ -1089,7 +1405,9 @@ async def clear_db_command(client: Client, message: Message):
     except Exception:
         include_rules = False
 
+    scrape_scheduler.cancel_all()
     await db.clear_data(include_rules=include_rules)
+    asyncio.create_task(refresh_realtime_pairs())
     lang = await _get_lang_from_message(message)
     await message.reply_text(_t(lang, "cleardb_done_all" if include_rules else "cleardb_done"))
 
@@ -1126,7 +1444,7 @@ async def add_pair_command(client: Client, message: Message):
                 except:
                     donor_channel = f"@{donor_channel}"
             else:
-                donor_channel = _normalize_chat_ref(donor_channel)
+                donor_channel = normalize_chat_ref(donor_channel)
             
             if target_channel.startswith('@'):
                 try:
@@ -1141,7 +1459,7 @@ async def add_pair_command(client: Client, message: Message):
                 except:
                     target_channel = f"@{target_channel}"
             else:
-                target_channel = _normalize_chat_ref(target_channel)
+                target_channel = normalize_chat_ref(target_channel)
         except Exception as e:
             await message.reply_text(_t(lang, "addpair_resolve_warn").format(error=str(e)))
         
@@ -1157,6 +1475,14 @@ async def add_pair_command(client: Client, message: Message):
         await message.reply_text(_t(lang, "generic_error").format(error=str(e)))
 
 
+def _split_pair_scope(raw: str) -> tuple[int | None, str]:
+    """`pair:<id> rest` -> (id, rest); anything else -> (None, raw)"""
+    match = re.match(r'pair:(\d+)\s*', raw, re.IGNORECASE)
+    if not match:
+        return None, raw
+    return int(match.group(1)), raw[match.end():].strip()
+
+
 async def add_button_rule_one_command(client: Client, message: Message):
     lang = await _get_lang_from_message(message)
     try:
@@ -1164,13 +1490,19 @@ async def add_button_rule_one_command(client: Client, message: Message):
         if len(payload) < 2:
             await message.reply_text(_t(lang, "addbtn1_usage"))
             return
-        raw = payload[1].strip()
+        pair_id, raw = _split_pair_scope(payload[1].strip())
+        if not raw:
+            await message.reply_text(_t(lang, "addbtn1_usage"))
+            return
+        if pair_id is not None and not await db.get_pair_by_id(pair_id):
+            await message.reply_text(_t(lang, "scrape_no_pair"))
+            return
         parts = [p.strip() for p in raw.split('|')]
         if len(parts) != 2:
             await message.reply_text(_t(lang, "button_rule_invalid"))
             return
 
-        await db.add_button_rule('one', parts[0], parts[1])
+        await db.add_button_rule('one', parts[0], parts[1], pair_id=pair_id)
         await message.reply_text(_t(lang, "button_rule_added"))
     except Exception as e:
         await message.reply_text(_t(lang, "generic_error").format(error=str(e)))
@@ -1183,7 +1515,13 @@ async def add_button_rule_two_command(client: Client, message: Message):
         if len(payload) < 2:
             await message.reply_text(_t(lang, "addbtn2_usage"))
             return
-        raw = payload[1].strip()
+        pair_id, raw = _split_pair_scope(payload[1].strip())
+        if not raw:
+            await message.reply_text(_t(lang, "addbtn2_usage"))
+            return
+        if pair_id is not None and not await db.get_pair_by_id(pair_id):
+            await message.reply_text(_t(lang, "scrape_no_pair"))
+            return
         groups = [g.strip() for g in raw.split('||')]
         if len(groups) != 2:
             await message.reply_text(_t(lang, "button_rule_invalid"))
@@ -1195,7 +1533,7 @@ async def add_button_rule_two_command(client: Client, message: Message):
             await message.reply_text(_t(lang, "button_rule_invalid"))
             return
 
-        await db.add_button_rule('two', p1[0], p1[1], p2[0], p2[1])
+        await db.add_button_rule('two', p1[0], p1[1], p2[0], p2[1], pair_id=pair_id)
         await message.reply_text(_t(lang, "button_rule_added"))
     except Exception as e:
         await message.reply_text(_t(lang, "generic_error").format(error=str(e)))
@@ -1208,7 +1546,13 @@ async def add_button_rule_three_command(client: Client, message: Message):
         if len(payload) < 2:
             await message.reply_text(_t(lang, "addbtn3_usage"))
             return
-        raw = payload[1].strip()
+        pair_id, raw = _split_pair_scope(payload[1].strip())
+        if not raw:
+            await message.reply_text(_t(lang, "addbtn3_usage"))
+            return
+        if pair_id is not None and not await db.get_pair_by_id(pair_id):
+            await message.reply_text(_t(lang, "scrape_no_pair"))
+            return
         groups = [g.strip() for g in raw.split('||')]
         if len(groups) != 3:
             await message.reply_text(_t(lang, "button_rule_invalid"))
@@ -1221,7 +1565,7 @@ async def add_button_rule_three_command(client: Client, message: Message):
             await message.reply_text(_t(lang, "button_rule_invalid"))
             return
 
-        await db.add_button_rule('three', p1[0], p1[1], p2[0], p2[1], p3[0], p3[1])
+        await db.add_button_rule('three', p1[0], p1[1], p2[0], p2[1], p3[0], p3[1], pair_id=pair_id)
         await message.reply_text(_t(lang, "button_rule_added"))
     except Exception as e:
         await message.reply_text(_t(lang, "generic_error").format(error=str(e)))
@@ -1230,8 +1574,107 @@ async def add_button_rule_three_command(client: Client, message: Message):
 async def remove_button_rule_command(client: Client, message: Message):
     lang = await _get_lang_from_message(message)
     try:
-        await db.clear_button_rules()
-        await message.reply_text(_t(lang, "button_rule_removed"))
+        payload = message.text.split(maxsplit=1)
+        pair_id = None
+        if len(payload) > 1:
+            pair_id, _ = _split_pair_scope(payload[1].strip())
+            if pair_id is None:
+                await message.reply_text(_t(lang, "removebtn_usage"))
+                return
+        await db.clear_button_rules(pair_id)
+        if pair_id is None:
+            await message.reply_text(_t(lang, "button_rule_removed"))
+        else:
+            await message.reply_text(_t(lang, "button_rule_removed_pair").format(pair_id=pair_id))
+    except Exception as e:
+        await message.reply_text(_t(lang, "generic_error").format(error=str(e)))
+
+
+async def scrape_dates_command(client: Client, message: Message):
+    """Queue a scrape of the posts published between two dates"""
+    lang = await _get_lang_from_message(message)
+    try:
+        parts = message.text.split()
+        if len(parts) != 4:
+            await message.reply_text(_t(lang, "scrape_range_usage"))
+            return
+        try:
+            pair_id = int(parts[1])
+        except ValueError:
+            await message.reply_text(_t(lang, "scrape_range_usage"))
+            return
+        try:
+            date_from = datetime.strptime(parts[2], "%Y-%m-%d").date()
+            date_to = datetime.strptime(parts[3], "%Y-%m-%d").date()
+        except ValueError:
+            await message.reply_text(_t(lang, "scrape_range_invalid"))
+            return
+        if date_from > date_to:
+            await message.reply_text(_t(lang, "scrape_range_invalid"))
+            return
+
+        pair = await db.get_pair_by_id(pair_id)
+        if not pair:
+            await message.reply_text(_t(lang, "scrape_no_pair"))
+            return
+        report = await _pair_access_report(client, pair["donor_channel"], pair["target_channel"])
+        if "❌" in report:
+            await message.reply_text(report)
+            return
+
+        params = {"date_from": date_from.isoformat(), "date_to": date_to.isoformat()}
+        job_id, created = await scrape_scheduler.submit(pair_id, "range", params)
+        if created:
+            text = _t(lang, "scrape_started_range").format(pair_id=pair_id, job_id=job_id, **params)
+        else:
+            text = _t(lang, "scrape_job_exists").format(pair_id=pair_id, job_id=job_id)
+        await message.reply_text(text)
+    except Exception as e:
+        await message.reply_text(_t(lang, "generic_error").format(error=str(e)))
+
+
+def _search_filter_names() -> str:
+    return ", ".join(f"`{name}`" for name in SEARCH_FILTERS)
+
+
+async def scrape_filter_command(client: Client, message: Message):
+    """Queue a scrape of the posts matching a search filter and/or keyword"""
+    lang = await _get_lang_from_message(message)
+    try:
+        parts = message.text.split(maxsplit=3)
+        if len(parts) < 3:
+            await message.reply_text(_t(lang, "scrape_filter_usage").format(filters=_search_filter_names()))
+            return
+        try:
+            pair_id = int(parts[1])
+        except ValueError:
+            await message.reply_text(_t(lang, "scrape_filter_usage").format(filters=_search_filter_names()))
+            return
+        filter_name = parts[2].strip().lower()
+        query = parts[3].strip() if len(parts) > 3 else ""
+        if filter_name not in SEARCH_FILTERS:
+            await message.reply_text(_t(lang, "scrape_filter_usage").format(filters=_search_filter_names()))
+            return
+        if filter_name == "all" and not query:
+            await message.reply_text(_t(lang, "scrape_filter_need_query"))
+            return
+
+        pair = await db.get_pair_by_id(pair_id)
+        if not pair:
+            await message.reply_text(_t(lang, "scrape_no_pair"))
+            return
+        report = await _pair_access_report(client, pair["donor_channel"], pair["target_channel"])
+        if "❌" in report:
+            await message.reply_text(report)
+            return
+
+        params = {"filter": filter_name, "query": query}
+        job_id, created = await scrape_scheduler.submit(pair_id, "filter", params)
+        if created:
+            text = _t(lang, "scrape_started_filter").format(pair_id=pair_id, job_id=job_id, **params)
+        else:
+            text = _t(lang, "scrape_job_exists").format(pair_id=pair_id, job_id=job_id)
+        await message.reply_text(text)
     except Exception as e:
         await message.reply_text(_t(lang, "generic_error").format(error=str(e)))
 
@@ -1246,9 +1689,11 @@ async def remove_pair_command(client: Client, message: Message):
             return
         
         pair_id = int(parts[1])
+        scrape_scheduler.cancel_pair(pair_id)
         removed_donor = await db.remove_channel_pair(pair_id)
         if removed_donor:
             clear_memory_cache(removed_donor)
+            asyncio.create_task(refresh_realtime_pairs())
         await message.reply_text(_t(lang, "remove_success").format(pair_id=pair_id))
     except ValueError:
         await message.reply_text(_t(lang, "remove_invalid"))
@@ -1381,6 +1826,8 @@ def setup_admin_handlers(client: Client):
     addbtn3_filter = filters.command("addbtn3") & filters.user(admin_id_int)
     removebtn_filter = filters.command("removebtn") & filters.user(admin_id_int)
     resetrules_filter = filters.command("resetrules") & filters.user(admin_id_int)
+    scrapedates_filter = filters.command("scrapedates") & filters.user(admin_id_int)
+    scrapefilter_filter = filters.command("scrapefilter") & filters.user(admin_id_int)
     
     # Setup ID resolver
     id_resolver_filter = filters.forwarded & filters.user(admin_id_int)
@@ -1399,3 +1846,5 @@ def setup_admin_handlers(client: Client):
     client.add_handler(MessageHandler(add_button_rule_three_command, addbtn3_filter))
     client.add_handler(MessageHandler(remove_button_rule_command, removebtn_filter))
     client.add_handler(MessageHandler(reset_rules_command, resetrules_filter))
+    client.add_handler(MessageHandler(scrape_dates_command, scrapedates_filter))
+    client.add_handler(MessageHandler(scrape_filter_command, scrapefilter_filter))
@@ -0,0 +1,231 @@
+from pyrogram import Client
+from database import db
+from handlers.scraper import (
+    scrape_latest_n_messages,
+    scrape_first_n_messages,
+    scrape_full_history,
+    scrape_date_range,
+    scrape_filtered,
+)
+from datetime import datetime, timedelta
+import asyncio
+
+try:
+    from config import SCRAPE_WORKERS
+except ImportError:
+    SCRAPE_WORKERS = '2'
+try:
+    SCRAPE_WORKERS = max(1, int(SCRAPE_WORKERS))
+except (TypeError, ValueError):
+    SCRAPE_WORKERS = 2
+
+# Short interactive scrapes jump ahead of history backfills
+DEFAULT_PRIORITIES = {
+    "latest": 20,
+    "first": 10,
+    "range": 5,
+    "filter": 5,
+    "full": 0,
+}
+
+
+async def _run_latest(client: Client, pair_id: int, params: dict):
+    await scrape_latest_n_messages(client, pair_id, int(params["limit"]))
+
+
+async def _run_first(client: Client, pair_id: int, params: dict):
+    await scrape_first_n_messages(client, pair_id, int(params["limit"]))
+
+
+async def _run_full(client: Client, pair_id: int, params: dict):
+    # A checkpoint only exists if this scrape was paused or interrupted
+    await scrape_full_history(client, pair_id, resume=True)
+
+
+async def _run_range(client: Client, pair_id: int, params: dict):
+    # Dates are whole days; the end day is included
+    date_from = datetime.strptime(params["date_from"], "%Y-%m-%d")
+    date_to = datetime.strptime(params["date_to"], "%Y-%m-%d") + timedelta(days=1)
+    await scrape_date_range(client, pair_id, date_from, date_to)
+
+
+async def _run_filter(client: Client, pair_id: int, params: dict):
+    await scrape_filtered(client, pair_id, params["filter"], params.get("query", ""))
+
+
+# kind -> coroutine running the job
+JOB_RUNNERS = {
+    "latest": _run_latest,
+    "first": _run_first,
+    "range": _run_range,
+    "filter": _run_filter,
+    "full": _run_full,
+}
+
+# Kinds that keep their progress when stopped, so a running job can be paused
+RESUMABLE_KINDS = {"full"}
+
+
+class ScrapeScheduler:
+    """
+    Runs the jobs of the scrape_jobs table on a fixed number of workers.
+    Queued jobs are taken by priority, then age; two jobs of the same pair
+    never run at the same time.
+    """
+
+    def __init__(self, workers: int = SCRAPE_WORKERS):
+        self.workers = workers
+        self._client: Client | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._claim_lock: asyncio.Lock | None = None
+        # job id -> (pair id, task)
+        self._running: dict[int, tuple[int, asyncio.Task]] = {}
+        self._worker_tasks: list[asyncio.Task] = []
+
+    def start(self, client: Client):
+        self._client = client
+        self._wakeup = asyncio.Event()
+        self._claim_lock = asyncio.Lock()
+        asyncio.create_task(self._restore_and_run())
+
+    async def _restore_and_run(self):
+        """Requeue jobs cut off by a restart and adopt orphaned checkpoints, then start the workers"""
+        try:
+            await db.requeue_running_scrape_jobs()
+            for checkpoint in await db.get_scrape_checkpoints():
+                if checkpoint["mode"] in JOB_RUNNERS:
+                    await db.add_scrape_job(
+                        checkpoint["pair_id"],
+                        checkpoint["mode"],
+                        priority=DEFAULT_PRIORITIES.get(checkpoint["mode"], 0),
+                    )
+        except Exception as e:
+            print(f"Error restoring scrape jobs: {str(e)}")
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def _wake(self):
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def submit(
+        self, pair_id: int, kind: str, params: dict | None = None, priority: int | None = None
+    ) -> tuple[int, bool]:
+        """Queue a job; returns (job_id, created), see Database.add_scrape_job"""
+        if kind not in JOB_RUNNERS:
+            raise ValueError(f"Unknown scrape job kind: {kind}")
+        if priority is None:
+            priority = DEFAULT_PRIORITIES.get(kind, 0)
+        job_id, created = await db.add_scrape_job(pair_id, kind, params, priority)
+        if created:
+            self._wake()
+        return job_id, created
+
+    def is_running(self, job_id: int) -> bool:
+        return job_id in self._running
+
+    async def pause(self, job_id: int) -> bool:
+        """Hold a queued job, or stop a running resumable one until resumed"""
+        job = await db.get_scrape_job(job_id)
+        if not job or job["status"] == "paused":
+            return False
+        if job["status"] == "running" and job["kind"] not in RESUMABLE_KINDS:
+            return False
+        await db.set_scrape_job_status(job_id, "paused")
+        self._stop(job_id)
+        return True
+
+    async def resume(self, job_id: int) -> bool:
+        job = await db.get_scrape_job(job_id)
+        if not job or job["status"] != "paused":
+            return False
+        await db.set_scrape_job_status(job_id, "queued")
+        self._wake()
+        return True
+
+    async def cancel(self, job_id: int) -> bool:
+        job = await db.get_scrape_job(job_id)
+        if not job:
+            return False
+        await db.delete_scrape_job(job_id)
+        task = self._stop(job_id)
+        if task:
+            # Let it unwind first so it does not save its checkpoint again
+            await asyncio.wait({task})
+        await db.delete_scrape_checkpoint(job["pair_id"], job["kind"])
+        return True
+
+    def cancel_pair(self, pair_id: int):
+        """Stop the running jobs of a pair (its rows go with the pair)"""
+        for job_id, (job_pair_id, _) in list(self._running.items()):
+            if job_pair_id == pair_id:
+                self._stop(job_id)
+
+    def cancel_all(self):
+        for job_id in list(self._running):
+            self._stop(job_id)
+
+    def _stop(self, job_id: int) -> asyncio.Task | None:
+        entry = self._running.get(job_id)
+        if not entry:
+            return None
+        entry[1].cancel()
+        return entry[1]
+
+    async def _claim(self) -> dict | None:
+        async with self._claim_lock:
+            busy_pairs = sorted({pair_id for pair_id, _ in self._running.values()})
+            job = await db.claim_scrape_job(busy_pairs)
+            if job:
+                task = asyncio.create_task(
+                    JOB_RUNNERS[job["kind"]](self._client, job["pair_id"], job["params"])
+                )
+                self._running[job["id"]] = (job["pair_id"], task)
+            return job
+
+    async def _worker(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                job = await self._claim()
+            except Exception as e:
+                print(f"Error taking a scrape job: {str(e)}")
+                await asyncio.sleep(5)
+                continue
+            if job is None:
+                await self._wakeup.wait()
+                continue
+
+            job_id = job["id"]
+            task = self._running[job_id][1]
+            print(f"Scrape job #{job_id} started: {job['kind']} for pair {job['pair_id']}")
+            try:
+                await asyncio.wait({task})
+            except asyncio.CancelledError:
+                # Shutdown: the job stays 'running' and is requeued on the next start
+                task.cancel()
+                raise
+            finally:
+                self._running.pop(job_id, None)
+
+            if task.cancelled():
+                # Paused or cancelled; the status was already updated
+                print(f"Scrape job #{job_id} stopped")
+            else:
+                if task.exception():
+                    print(f"Scrape job #{job_id} failed: {str(task.exception())}")
+                else:
+                    print(f"Scrape job #{job_id} finished")
+                try:
+                    await db.delete_scrape_job(job_id)
+                except Exception as e:
+                    print(f"Error removing scrape job #{job_id}: {str(e)}")
+            # A pair became free, so a job skipped for it may now be runnable
+            self._wake()
+
+
+scrape_scheduler = ScrapeScheduler()
+
+
+def start_scrape_scheduler(client: Client):
+    """Start the job workers on the account that reads the donors"""
+    scrape_scheduler.start(client)
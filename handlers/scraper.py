@@ -1,14 +1,98 @@
-from pyrogram import Client
+from pyrogram import Client, filters, raw, enums
+from pyrogram import utils as pyrogram_utils
+from pyrogram.handlers import MessageHandler
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
-from database import db
-from utils.media_handler import clone_message, clone_media_group, download_and_clone_message, apply_link_rules_to_text
+from database import db, pair_delivery_key
+from utils.media_handler import (
+    clone_message,
+    clone_media_group,
+    download_and_clone_message,
+    apply_link_rules_to_text,
+    copy_media_group_to_target,
+    can_copy_message,
+    download_for_upload,
+    release_download,
+    cached_upload_file_id,
+    forget_upload,
+    rejected_file_id,
+)
+from utils.album_assembler import AlbumAssembler
+from utils.peer_resolver import peer_resolver
+from datetime import datetime
 import asyncio
 import os
+import time
 
+try:
+    from config import REALTIME_MODE
+except ImportError:
+    REALTIME_MODE = 'push'
+# 'poll' falls back to the polling loop; anything else uses update handlers
+REALTIME_PUSH = str(REALTIME_MODE).strip().lower() != 'poll'
+try:
+    from config import BACKFILL_DOWNLOAD_CONCURRENCY
+except ImportError:
+    BACKFILL_DOWNLOAD_CONCURRENCY = '3'
+try:
+    BACKFILL_DOWNLOAD_CONCURRENCY = max(1, int(BACKFILL_DOWNLOAD_CONCURRENCY))
+except (TypeError, ValueError):
+    BACKFILL_DOWNLOAD_CONCURRENCY = 3
+try:
+    from config import TARGET_ACCESS_TTL
+except ImportError:
+    TARGET_ACCESS_TTL = '3600'
+try:
+    TARGET_ACCESS_TTL = float(TARGET_ACCESS_TTL)
+except (TypeError, ValueError):
+    TARGET_ACCESS_TTL = 3600.0
+
+# Retry a failed target check after 60 s, doubling up to an hour
+TARGET_ACCESS_BACKOFF = 60.0
+TARGET_ACCESS_BACKOFF_MAX = 3600.0
 
-_client_is_bot_cache = {}
 
 _sender_client: Client | None = None
+_reader_client: Client | None = None
+
+# Realtime routing: donor chat id -> enabled pairs reading from that donor
+_realtime_routes: dict[int, list[dict]] = {}
+_realtime_locks: dict[int, asyncio.Lock] = {}
+_realtime_refresh_lock: asyncio.Lock | None = None
+# Donor chats already checked for posts missed while offline
+_realtime_caught_up: set[int] = set()
+
+# At most this many missed posts per donor are cloned by the catch-up pass
+REALTIME_CATCHUP_LIMIT = 100
+
+# A target that failed a unit gets it again on later passes, this many times
+# in all; realtime posts get their next pass after REALTIME_RETRY_DELAY
+MAX_DELIVERY_ATTEMPTS = 3
+REALTIME_RETRY_DELAY = 60.0
+# (per-pair key, first message id of the unit) -> failed attempts so far
+_delivery_attempts: dict[tuple[str, int], int] = {}
+
+# Bot access to targets: (id(bot), target) -> {"state", "checked_at", "failures"}
+# state is "ok", "needs-warmup" (check before the next use) or "failed"
+_target_access: dict[tuple, dict] = {}
+_target_access_locks: dict[tuple, asyncio.Lock] = {}
+
+# Pairs with a full-history scrape running in this process
+_full_scrapes_running: set[int] = set()
+
+# Filter names accepted by the filtered scrape -> Telegram search filter
+SEARCH_FILTERS = {
+    "all": enums.MessagesFilter.EMPTY,
+    "photo": enums.MessagesFilter.PHOTO,
+    "video": enums.MessagesFilter.VIDEO,
+    "photo_video": enums.MessagesFilter.PHOTO_VIDEO,
+    "document": enums.MessagesFilter.DOCUMENT,
+    "audio": enums.MessagesFilter.AUDIO,
+    "voice": enums.MessagesFilter.VOICE_NOTE,
+    "video_note": enums.MessagesFilter.VIDEO_NOTE,
+    "animation": enums.MessagesFilter.ANIMATION,
+    "url": enums.MessagesFilter.URL,
+    "pinned": enums.MessagesFilter.PINNED,
+}
 
 
 def set_sender_client(client: Client | None):
@@ -16,75 +100,374 @@ def set_sender_client(client: Client | None):
     _sender_client = client
 
 
-async def _is_bot_client(client: Client) -> bool:
-    key = id(client)
-    if key in _client_is_bot_cache:
-        return _client_is_bot_cache[key]
-    try:
-        me = await client.get_me()
-        val = bool(getattr(me, "is_bot", False))
-        _client_is_bot_cache[key] = val
-        return val
-    except Exception:
-        return False
+async def _resolve_chat(client: Client, donor_channel: str):
+    """Resolve a chat reference through the persistent peer cache"""
+    return await peer_resolver.resolve(client, donor_channel)
 
 
-async def _resolve_chat(client: Client, donor_channel: str):
-    try:
-        if donor_channel.startswith('@'):
-            return await client.get_chat(donor_channel)
-
-        normalized = (
-            str(donor_channel)
-            .strip()
-            .replace("−", "-")
-            .replace("–", "-")
-            .replace("—", "-")
-        )
-        chat_id = int(normalized)
+async def _forget_peer_on_error(client: Client, chat_ref: str, e: Exception):
+    """A cached id stopped working: resolve it from scratch next time"""
+    error_msg = str(e)
+    if "PEER_ID_INVALID" in error_msg or "CHANNEL_INVALID" in error_msg or "CHANNEL_PRIVATE" in error_msg:
         try:
-            return await client.get_chat(chat_id)
+            await peer_resolver.forget(client, chat_ref)
         except Exception:
-            if await _is_bot_client(client):
-                raise
-            async for dialog in client.get_dialogs(limit=2000):
-                _ = dialog.chat.id
-            return await client.get_chat(chat_id)
-    except Exception:
-        raise
+            pass
 
 
 # Track last processed message ids per channel
 last_message_ids = {}
 
 
+def _target_access_due(entry: dict | None) -> bool:
+    """Whether the cached access state has to be verified again"""
+    if entry is None or entry["state"] == "needs-warmup":
+        return True
+    age = time.monotonic() - entry["checked_at"]
+    if entry["state"] == "ok":
+        return age >= TARGET_ACCESS_TTL
+    backoff = min(TARGET_ACCESS_BACKOFF * 2 ** (entry["failures"] - 1), TARGET_ACCESS_BACKOFF_MAX)
+    return age >= backoff
+
+
+def _invalidate_target_access(target_ref: str):
+    """A send failed with PEER_ID_INVALID: verify the target before the next use"""
+    for key, entry in _target_access.items():
+        if key[1] == str(target_ref):
+            entry["state"] = "needs-warmup"
+
+
 async def _ensure_bot_access_to_target(bot_client: Client, user_client: Client, target_ref: str):
     """
     Ensure the bot can access the target channel.
     If bot.get_chat(id) fails, use user_client to find the username,
     then bot.get_chat(username) to warm up the cache.
+    The outcome is cached per target: verified again after TARGET_ACCESS_TTL,
+    after a send failed with PEER_ID_INVALID, or with backoff after a failure.
     """
     if not bot_client:
         return
 
+    key = (id(bot_client), str(target_ref))
+    if not _target_access_due(_target_access.get(key)):
+        return
+
+    lock = _target_access_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        entry = _target_access.get(key)
+        if not _target_access_due(entry):
+            return
+        failures = entry["failures"] if entry else 0
+        ok = await _check_bot_access_to_target(bot_client, user_client, target_ref)
+        _target_access[key] = {
+            "state": "ok" if ok else "failed",
+            "checked_at": time.monotonic(),
+            "failures": 0 if ok else failures + 1,
+        }
+
+
+async def _check_bot_access_to_target(bot_client: Client, user_client: Client, target_ref: str) -> bool:
     try:
         # Try direct access first
         await bot_client.get_chat(target_ref)
+        return True
     except Exception:
         # If it fails, try to resolve via user
         try:
             print(f"Bot failed to resolve {target_ref}. Trying via User...")
-            user_side_chat = await user_client.get_chat(target_ref)
+            user_side_chat = await peer_resolver.resolve(user_client, target_ref)
             if user_side_chat.username:
                 print(f"Resolved {target_ref} to @{user_side_chat.username}. Teaching Bot...")
                 await bot_client.get_chat(user_side_chat.username)
                 print(f"Bot successfully cached {target_ref}")
-            else:
-                print(f"⚠️ Channel {target_ref} has no username. Bot cannot resolve it by ID without interaction.")
+                return True
+            print(f"⚠️ Channel {target_ref} has no username. Bot cannot resolve it by ID without interaction.")
         except Exception as e:
             print(f"Failed to resolve {target_ref} via User: {e}")
+        return False
+
+
+
+async def _filter_new_messages(channel_key: str, messages: list) -> list:
+    """Drop already processed messages from a page with a single DB query"""
+    if not messages:
+        return []
+    fresh = set(await db.filter_unprocessed(channel_key, [m.id for m in messages]))
+    return [m for m in messages if m.id in fresh]
+
+
+def _group_albums(messages: list) -> list[list]:
+    """Split id-ordered messages into units: one post, or all parts of one album"""
+    units = []
+    albums = {}
+    for message in messages:
+        group_id = message.media_group_id
+        if not group_id:
+            units.append([message])
+        elif group_id in albums:
+            albums[group_id].append(message)
+        else:
+            albums[group_id] = [message]
+            units.append(albums[group_id])
+    return units
+
+
+async def _complete_album(client: Client, chat_id: int, channel_key: str, unit: list) -> list:
+    """Add the unprocessed parts of an album that are missing from the unit"""
+    if not unit[0].media_group_id:
+        return unit
+    try:
+        parts = await client.get_media_group(chat_id, unit[0].id)
+    except Exception as e:
+        print(f"Warning: Could not fetch the rest of album {unit[0].media_group_id}: {str(e)}")
+        return unit
+    known = {m.id for m in unit}
+    extra = await _filter_new_messages(channel_key, [m for m in parts if m.id not in known])
+    if not extra:
+        return unit
+    return sorted(unit + extra, key=lambda x: x.id)
+
+
+async def _complete_edge_albums(client: Client, chat_id: int, channel_key: str, units: list[list]) -> list[list]:
+    """
+    Units built from one page of history: an album at either edge of the page
+    may have parts outside it, so fetch the rest of those albums.
+    """
+    for index in {0, len(units) - 1} if units else ():
+        units[index] = await _complete_album(client, chat_id, channel_key, units[index])
+    return units
+
+
+def _report_clone_error(message, donor_channel: str, target_channel: str, e: Exception, mode: str = ""):
+    if "PEER_ID_INVALID" in str(e):
+        _invalidate_target_access(target_channel)
+        print(
+            f"Error cloning message {message.id}: PEER_ID_INVALID. Target: {target_channel}. Hint: Ensure the BOT is an admin in the target channel (or User is a member if using User mode)."
+        )
+    else:
+        suffix = f" ({mode})" if mode else ""
+        print(f"Error processing message {message.id} from {donor_channel}{suffix}: {str(e)}")
+
+
+async def _send_unit(
+    client: Client,
+    unit: list,
+    target_channel: str,
+    pair_id: int,
+    copy_mode: bool = False,
+    prefetched = None,
+):
+    """Clone one post or one whole album into a target (service messages are skipped)"""
+    first = unit[0]
+    if getattr(first, "service", False):
+        return
+
+    if first.media_group_id:
+        await download_and_clone_media_group(
+            client,
+            unit,
+            target_channel,
+            pair_id,
+            sender_client=_sender_client,
+            copy_mode=copy_mode,
+            prefetched=prefetched,
+        )
+    else:
+        await download_and_clone_message(
+            client,
+            first,
+            target_channel,
+            pair_id,
+            sender_client=_sender_client,
+            copy_mode=copy_mode,
+            prefetched=prefetched,
+        )
+
+
+async def _clone_unit(
+    client: Client,
+    unit: list,
+    channel_key: str,
+    target_channel: str,
+    pair_id: int,
+    copy_mode: bool = False,
+    prefetched = None,
+):
+    """
+    Clone one post or one whole album, then mark all its messages processed.
+    prefetched: result of _prefetch_unit for this unit, if any.
+    """
+    await _send_unit(client, unit, target_channel, pair_id, copy_mode, prefetched)
+    for msg in unit:
+        await db.mark_message_processed(channel_key, msg.id)
+
+
+async def _fan_out_unit(client: Client, unit: list, channel_key: str, pairs: list[dict], mode: str = "") -> bool:
+    """
+    Clone one unit of a donor into every target reading from it.
+    The first target downloads and uploads the media; the others get it by
+    the sender's cached file_id. Buttons, copy mode and statistics stay per
+    pair. The unit is marked processed once every target has it or gave up
+    after MAX_DELIVERY_ATTEMPTS; until then the targets that got it are
+    remembered per pair, so a later pass only retries the failed ones.
+    Returns False if a target is still to be retried.
+    """
+    if getattr(unit[0], "service", False):
+        await db.mark_message_processed(channel_key, unit[0].id)
+        return True
+
+    retry = False
+    delivered_keys = []
+    earlier_keys = []
+    for pair in pairs:
+        pair_key = pair_delivery_key(channel_key, pair['id'])
+        attempt_key = (pair_key, unit[0].id)
+        if not await _filter_new_messages(pair_key, unit):
+            # Sent on an earlier pass that failed for another target
+            earlier_keys.append(pair_key)
+            continue
+        try:
+            await _send_unit(
+                client, unit, pair['target_channel'], pair['id'], bool(pair.get('copy_mode'))
+            )
+            delivered_keys.append(pair_key)
+            _delivery_attempts.pop(attempt_key, None)
+        except Exception as e:
+            _report_clone_error(unit[0], channel_key, pair['target_channel'], e, mode)
+            attempts = _delivery_attempts.pop(attempt_key, 0) + 1
+            if attempts < MAX_DELIVERY_ATTEMPTS:
+                _delivery_attempts[attempt_key] = attempts
+                retry = True
+            else:
+                print(
+                    f"Giving up on message {unit[0].id} from {channel_key} for "
+                    f"{pair['target_channel']} after {attempts} attempts."
+                )
+
+    if retry:
+        for pair_key in delivered_keys:
+            for msg in unit:
+                await db.mark_message_processed(pair_key, msg.id)
+        return False
+
+    for msg in unit:
+        await db.mark_message_processed(channel_key, msg.id)
+    # The donor-wide mark covers the unit now
+    for pair_key in earlier_keys:
+        await db.clear_processed(pair_key, [msg.id for msg in unit])
+    return True
+
+
+async def _prefetch_unit(client: Client, unit: list, copy_mode: bool):
+    """
+    Download a unit's media ahead of sending.
+    Returns a file for a single post, a list of files for an album, or None
+    when there is nothing to download (the clone then works as usual).
+    """
+    first = unit[0]
+    if getattr(first, "service", False):
+        return None
+    sender = _sender_client or client
+    if copy_mode and all(can_copy_message(sender, msg) for msg in unit):
+        return None
+
+    if first.media_group_id:
+        files = []
+        for msg in unit:
+            file = None
+            try:
+                # Media the sender uploaded before is sent by file_id
+                if (msg.photo or msg.video or msg.document or msg.audio) and not await cached_upload_file_id(sender, msg):
+                    file = await download_for_upload(client, msg)
+            except Exception as e:
+                print(f"Warning: Could not download media for message {msg.id}: {str(e)}")
+            files.append(file)
+        return files
+
+    if first.photo or first.video or first.document or first.audio or first.voice:
+        if await cached_upload_file_id(sender, first):
+            return None
+        return await download_for_upload(client, first)
+    return None
 
 
+def _release_prefetched(files):
+    if isinstance(files, list):
+        for file in files:
+            release_download(file)
+    else:
+        release_download(files)
+
+
+async def _last_message_id_before(client: Client, chat_id: int, date: datetime) -> int:
+    """Id of the newest message posted before date, 0 if there is none"""
+    async for message in client.get_chat_history(chat_id, limit=1, offset_date=date):
+        return message.id
+    return 0
+
+
+async def _history_pages_oldest_first(
+    client: Client,
+    chat_id: int,
+    after_id: int = 0,
+    max_id: int = 0,
+    page_size: int = 100,
+    query: str = "",
+    messages_filter: enums.MessagesFilter | None = None,
+):
+    """
+    Yield pages of a chat's history oldest-first, starting after after_id and,
+    if max_id is set, ending with it.
+    messages.getHistory with offset_id = cursor + 1 and add_offset = -page_size
+    returns the page_size messages right above the cursor, so only the pages
+    actually consumed are fetched. With a query or messages_filter the same
+    paging runs on messages.search, so only matching messages are fetched.
+    """
+    peer = await client.resolve_peer(chat_id)
+    search = bool(query) or messages_filter not in (None, enums.MessagesFilter.EMPTY)
+    cursor = after_id
+    while not max_id or cursor < max_id:
+        # Near max_id ask only for the ids that can still be in range
+        limit = min(page_size, max_id - cursor) if max_id else page_size
+        if search:
+            request = raw.functions.messages.Search(
+                peer=peer,
+                q=query,
+                filter=(messages_filter or enums.MessagesFilter.EMPTY).value(),
+                min_date=0,
+                max_date=0,
+                offset_id=cursor + 1,
+                add_offset=-limit,
+                limit=limit,
+                max_id=0,
+                min_id=0,
+                hash=0
+            )
+        else:
+            request = raw.functions.messages.GetHistory(
+                peer=peer,
+                offset_id=cursor + 1,
+                offset_date=0,
+                add_offset=-limit,
+                limit=limit,
+                max_id=0,
+                min_id=0,
+                hash=0
+            )
+        response = await client.invoke(request, sleep_threshold=60)
+        messages = await pyrogram_utils.parse_messages(client, response, replies=0)
+        messages = sorted(
+            (m for m in messages if m.id > cursor and (not max_id or m.id <= max_id)),
+            key=lambda x: x.id
+        )
+        if not messages:
+            return
+        cursor = messages[-1].id
+        # Deleted messages still move the cursor but are not yielded
+        page = [m for m in messages if not getattr(m, "empty", False)]
+        if page:
+            yield page
+
 
 def clear_memory_cache(channel_id: str):
     """Clear memory cache for a channel"""
@@ -92,8 +475,8 @@ def clear_memory_cache(channel_id: str):
         del last_message_ids[channel_id]
 
 
-async def monitor_channel(client: Client, donor_channel: str, target_channel: str, pair_id: int):
-    """Monitor a donor channel and clone new messages"""
+async def monitor_channel(client: Client, donor_channel: str, pairs: list[dict]):
+    """Monitor a donor channel once and clone new messages into all its targets"""
     try:
         # Get channel chat
         try:
@@ -139,94 +522,46 @@ async def monitor_channel(client: Client, donor_channel: str, target_channel: st
                 return # Skip processing for this first iteration
             except Exception as e:
                 print(f"Error initializing fresh start for {donor_channel}: {str(e)}")
+                await _forget_peer_on_error(client, donor_channel, e)
                 return
 
         # Get last processed message ID
         last_id = last_message_ids.get(channel_key, 0)
         
         # Get recent messages (limit 10 for efficiency)
-        messages_list = []
+        page = []
         try:
             async for message in client.get_chat_history(chat.id, limit=10):
-                # Skip if already processed
-                if await db.is_message_processed(channel_key, message.id):
-                    continue
-                
                 # Skip if older than last processed
                 if message.id <= last_id:
                     continue
                 
-                messages_list.append(message)
-                last_message_ids[channel_key] = max(last_message_ids.get(channel_key, 0), message.id)
+                page.append(message)
         except Exception as e:
             print(f"Error getting chat history for {donor_channel}: {str(e)}")
+            await _forget_peer_on_error(client, donor_channel, e)
             return
         
+        # Skip already processed messages (one query for the whole page)
+        messages_list = await _filter_new_messages(channel_key, page)
         if not messages_list:
             return
-        
+
         # Reverse to process in chronological order
         messages_list.reverse()
-        
-        # Process messages
-        for message in messages_list:
-            try:
-                # Check if already processed (double check)
-                if await db.is_message_processed(channel_key, message.id):
-                    continue
 
-                if getattr(message, "service", False):
-                    await db.mark_message_processed(channel_key, message.id)
-                    continue
-                
-                # Handle media groups
-                if message.media_group_id:
-                    # Collect all messages in the group
-                    group_messages = [message]
-                    group_id = message.media_group_id
-                    
-                    # Wait a bit for all messages in group to arrive
-                    await asyncio.sleep(1)
-                    
-                    # Try to get other messages in the group
-                    async for msg in client.get_chat_history(chat.id, limit=20):
-                        if msg.media_group_id == group_id and msg.id != message.id:
-                            if not await db.is_message_processed(channel_key, msg.id):
-                                group_messages.append(msg)
-                    
-                    # Sort by message ID
-                    group_messages.sort(key=lambda x: x.id)
-                    
-                    # Clone media group
-                    await download_and_clone_media_group(
-                        client,
-                        group_messages,
-                        target_channel,
-                        pair_id,
-                        sender_client=_sender_client
-                    )
-                    
-                    # Mark all as processed
-                    for msg in group_messages:
-                        await db.mark_message_processed(channel_key, msg.id)
-                else:
-                    # Regular message
-                    await download_and_clone_message(
-                        client,
-                        message,
-                        target_channel,
-                        pair_id,
-                        sender_client=_sender_client
-                    )
-                    await db.mark_message_processed(channel_key, message.id)
-                    
-            except Exception as e:
-                # Specific error handling for PEER_ID_INVALID during processing
-                if "PEER_ID_INVALID" in str(e):
-                     print(f"Error cloning message {message.id}: PEER_ID_INVALID. Target: {target_channel}. Hint: Ensure the BOT is an admin in the target channel (or User is a member if using User mode).")
-                else:
-                    print(f"Error processing message {message.id} from {donor_channel}: {str(e)}")
-                continue
+        # Process messages; albums are cloned as one unit, even when cut by the page
+        units = await _complete_edge_albums(client, chat.id, channel_key, _group_albums(messages_list))
+        # The baseline stops at the first unit a target missed, so it is retried next
+        # pass (up to MAX_DELIVERY_ATTEMPTS times)
+        complete = True
+        for unit in units:
+            delivered = await _fan_out_unit(client, unit, channel_key, pairs)
+            complete = complete and delivered
+            if complete:
+                last_message_ids[channel_key] = max(
+                    last_message_ids.get(channel_key, 0), *(message.id for message in unit)
+                )
     
     except Exception as e:
         print(f"Error monitoring channel {donor_channel}: {str(e)}")
@@ -238,6 +573,7 @@ async def scrape_latest_n_messages(client: Client, pair_id: int, limit: int):
         return
     donor_channel = pair["donor_channel"]
     target_channel = pair["target_channel"]
+    copy_mode = bool(pair.get("copy_mode"))
 
     # Ensure bot can see the target channel
     if _sender_client:
@@ -250,71 +586,50 @@ async def scrape_latest_n_messages(client: Client, pair_id: int, limit: int):
         return
 
     channel_key = donor_channel
-    messages_list = []
+    page = []
     try:
         async for message in client.get_chat_history(chat.id, limit=limit):
-            if await db.is_message_processed(channel_key, message.id):
-                continue
-            messages_list.append(message)
+            page.append(message)
     except Exception as e:
         print(f"Error getting chat history for {donor_channel} (latest): {str(e)}")
+        await _forget_peer_on_error(client, donor_channel, e)
         return
 
+    messages_list = await _filter_new_messages(channel_key, page)
     if not messages_list:
         return
 
     messages_list.reverse()
 
-    for message in messages_list:
+    units = await _complete_edge_albums(client, chat.id, channel_key, _group_albums(messages_list))
+    for unit in units:
         try:
-            if await db.is_message_processed(channel_key, message.id):
-                continue
-
-            if getattr(message, "service", False):
-                await db.mark_message_processed(channel_key, message.id)
-                continue
-
-            if message.media_group_id:
-                group_messages = [message]
-                group_id = message.media_group_id
-                await asyncio.sleep(1)
-                async for msg in client.get_chat_history(chat.id, limit=20):
-                    if msg.media_group_id == group_id and msg.id != message.id:
-                        if not await db.is_message_processed(channel_key, msg.id):
-                            group_messages.append(msg)
-                group_messages.sort(key=lambda x: x.id)
-                await download_and_clone_media_group(
-                    client,
-                    group_messages,
-                    target_channel,
-                    pair_id,
-                )
-                for msg in group_messages:
-                    await db.mark_message_processed(channel_key, msg.id)
-            else:
-                await download_and_clone_message(
-                    client,
-                    message,
-                    target_channel,
-                    pair_id,
-                    sender_client=_sender_client,
-                )
-                await db.mark_message_processed(channel_key, message.id)
+            await _clone_unit(client, unit, channel_key, target_channel, pair_id, copy_mode)
         except Exception as e:
-            if "PEER_ID_INVALID" in str(e):
-                print(
-                    f"Error cloning message {message.id}: PEER_ID_INVALID. Target: {target_channel}. Hint: Ensure the BOT is an admin in the target channel (or User is a member if using User mode)."
-                )
-            else:
-                print(
-                    f"Error processing message {message.id} from {donor_channel} (latest): {str(e)}"
-                )
+            _report_clone_error(unit[0], donor_channel, target_channel, e, "latest")
             continue
 
 
-async def scrape_full_history(client: Client, pair_id: int):
+async def scrape_full_history(client: Client, pair_id: int, resume: bool = False):
+    """
+    Clone a donor's whole history oldest to newest. Progress is checkpointed
+    in SQLite after every page, so with resume=True an interrupted scrape
+    continues after the last finished page instead of starting over.
+    """
+    if pair_id in _full_scrapes_running:
+        print(f"Full scrape for pair {pair_id} is already running")
+        return
+    _full_scrapes_running.add(pair_id)
+    try:
+        await _scrape_full_history(client, pair_id, resume)
+    finally:
+        _full_scrapes_running.discard(pair_id)
+
+
+async def _scrape_full_history(client: Client, pair_id: int, resume: bool):
     pair = await db.get_pair_by_id(pair_id)
     if not pair:
+        await db.delete_scrape_checkpoint(pair_id, "full")
         return
     donor_channel = pair["donor_channel"]
     target_channel = pair["target_channel"]
@@ -328,73 +643,242 @@ async def scrape_full_history(client: Client, pair_id: int):
         print(f"Error getting chat {donor_channel} for full scrape: {str(e)}")
         return
 
+    checkpoint = await db.get_scrape_checkpoint(pair_id, "full") if resume else None
+    if checkpoint and checkpoint["direction"] == "forward":
+        progress = {
+            "offset_id": checkpoint["offset_id"],
+            "sent": checkpoint["sent"],
+            "failed": checkpoint["failed"],
+        }
+        print(f"Resuming full scrape for pair {pair_id} after message {progress['offset_id']}")
+    else:
+        # Older newest-first checkpoints cannot be continued forward; start over,
+        # already processed posts are skipped anyway
+        progress = {"offset_id": 0, "sent": 0, "failed": 0}
+    await db.save_scrape_checkpoint(pair_id, "full", "forward", **progress)
+
+    if await _backfill(client, pair, chat, progress, "full", checkpoint_mode="full"):
+        await db.delete_scrape_checkpoint(pair_id, "full")
+        print(
+            f"Full scrape for pair {pair_id} finished: "
+            f"{progress['sent']} sent, {progress['failed']} failed"
+        )
+
+
+async def _backfill(
+    client: Client,
+    pair: dict,
+    chat,
+    progress: dict,
+    mode: str,
+    max_id: int = 0,
+    checkpoint_mode: str | None = None,
+    query: str = "",
+    messages_filter: enums.MessagesFilter | None = None,
+) -> bool:
+    """
+    Clone a donor's history after progress["offset_id"] (up to max_id, if set)
+    oldest to newest, or only the messages matching query / messages_filter.
+    progress also counts sent and failed posts; with checkpoint_mode it is
+    saved as that checkpoint after every page.
+    Returns True once the end was reached and everything was handed over.
+    """
+    pair_id = pair["id"]
+    donor_channel = pair["donor_channel"]
+    target_channel = pair["target_channel"]
+    copy_mode = bool(pair.get("copy_mode"))
     channel_key = donor_channel
-    offset_id = 0
+    concurrency = BACKFILL_DOWNLOAD_CONCURRENCY
+    finished = False
+    # Search returns only the matching parts of an album; the rest is fetched
+    search = bool(query) or messages_filter is not None
 
-    while True:
-        batch = []
+    # Pipeline: page fetcher -> N media downloaders -> one sender.
+    # Every unit gets a future that a downloader resolves with its prefetched
+    # media; the sender awaits the futures in fetch order, so posts keep their
+    # order while downloads overlap. Bounded queues cap the prefetched units.
+    download_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    send_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def fetch_units():
+        nonlocal finished
+        # Parts of an album that may continue on the next page
+        carried = []
         try:
-            async for message in client.get_chat_history(
-                chat.id, offset_id=offset_id, limit=100
+            async for page in _history_pages_oldest_first(
+                client,
+                chat.id,
+                after_id=progress["offset_id"],
+                max_id=max_id,
+                query=query,
+                messages_filter=messages_filter,
             ):
-                batch.append(message)
+                fresh = carried + await _filter_new_messages(channel_key, page)
+                units = _group_albums(fresh)
+                carried = []
+                if units and units[-1][0].media_group_id:
+                    carried = units.pop()
+                # Everything up to here is queued; a carried album is fetched again on resume
+                offset_id = carried[0].id - 1 if carried else page[-1].id
+
+                for unit in units:
+                    if search:
+                        unit = await _complete_album(client, chat.id, channel_key, unit)
+                    future = asyncio.get_running_loop().create_future()
+                    await send_queue.put((unit, future))
+                    await download_queue.put((unit, future))
+                # The page is done once the sender gets here
+                await send_queue.put((None, offset_id))
         except Exception as e:
-            print(f"Error getting chat history for {donor_channel} (full): {str(e)}")
+            print(f"Error getting chat history for {donor_channel} ({mode}): {str(e)}")
+            await _forget_peer_on_error(client, donor_channel, e)
             return
 
-        if not batch:
-            break
+        if carried:
+            if search:
+                carried = await _complete_album(client, chat.id, channel_key, carried)
+            future = asyncio.get_running_loop().create_future()
+            await send_queue.put((carried, future))
+            await download_queue.put((carried, future))
+        finished = True
 
-        batch.sort(key=lambda x: x.id)
+    async def fetch_pages():
+        try:
+            await fetch_units()
+        except Exception as e:
+            print(f"Error fetching history for {donor_channel} ({mode}): {str(e)}")
+        await send_queue.put(None)
+        for _ in range(concurrency):
+            await download_queue.put(None)
 
-        for message in batch:
+    async def download_units():
+        while True:
+            item = await download_queue.get()
+            if item is None:
+                return
+            unit, future = item
             try:
-                if await db.is_message_processed(channel_key, message.id):
-                    continue
-
-                if getattr(message, "service", False):
-                    await db.mark_message_processed(channel_key, message.id)
-                    continue
+                files = await _prefetch_unit(client, unit, copy_mode)
+            except Exception as e:
+                print(f"Warning: Could not prefetch message {unit[0].id}: {str(e)}")
+                files = None
+            if future.cancelled():
+                _release_prefetched(files)
+            else:
+                future.set_result(files)
 
-                if message.media_group_id:
-                    group_messages = [message]
-                    group_id = message.media_group_id
-                    await asyncio.sleep(1)
-                    async for msg in client.get_chat_history(chat.id, limit=20):
-                        if msg.media_group_id == group_id and msg.id != message.id:
-                            if not await db.is_message_processed(channel_key, msg.id):
-                                group_messages.append(msg)
-                    group_messages.sort(key=lambda x: x.id)
-                    await download_and_clone_media_group(
-                        client,
-                        group_messages,
-                        target_channel,
-                        pair_id,
-                        sender_client=_sender_client
-                    )
-                    for msg in group_messages:
-                        await db.mark_message_processed(channel_key, msg.id)
-                else:
-                    await download_and_clone_message(
-                        client,
-                        message,
-                        target_channel,
-                        pair_id,
-                        sender_client=_sender_client,
-                    )
-                    await db.mark_message_processed(channel_key, message.id)
+    async def send_units():
+        while True:
+            item = await send_queue.get()
+            if item is None:
+                return
+            unit, future = item
+            if unit is None:
+                progress["offset_id"] = future
+                if checkpoint_mode:
+                    await db.save_scrape_checkpoint(pair_id, checkpoint_mode, "forward", **progress)
+                continue
+            files = await future
+            try:
+                await _clone_unit(
+                    client, unit, channel_key, target_channel, pair_id, copy_mode, files
+                )
+                progress["sent"] += 1
             except Exception as e:
-                if "PEER_ID_INVALID" in str(e):
-                    print(
-                        f"Error cloning message {message.id}: PEER_ID_INVALID. Target: {target_channel}. Hint: Ensure the BOT is an admin in the target channel (or User is a member if using User mode)."
-                    )
-                else:
-                    print(
-                        f"Error processing message {message.id} from {donor_channel} (full): {str(e)}"
-                    )
+                progress["failed"] += 1
+                _report_clone_error(unit[0], donor_channel, target_channel, e, mode)
+
+    workers = [asyncio.create_task(fetch_pages())]
+    workers += [asyncio.create_task(download_units()) for _ in range(concurrency)]
+    try:
+        await send_units()
+        return finished
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # Free media prefetched for units that were never sent
+        while not send_queue.empty():
+            item = send_queue.get_nowait()
+            if item is None:
+                continue
+            unit, future = item
+            if unit is None:
                 continue
+            if future.done() and not future.cancelled():
+                _release_prefetched(future.result())
+            else:
+                future.cancel()
+
+
+async def scrape_date_range(client: Client, pair_id: int, date_from: datetime, date_to: datetime):
+    """
+    Clone the posts published in [date_from, date_to) oldest to newest.
+    Both bounds are turned into message ids with one offset_date lookup each,
+    so only messages inside the window are fetched.
+    """
+    pair = await db.get_pair_by_id(pair_id)
+    if not pair:
+        return
+    donor_channel = pair["donor_channel"]
+
+    # Ensure bot can see the target channel
+    if _sender_client:
+        await _ensure_bot_access_to_target(_sender_client, client, pair["target_channel"])
+    try:
+        chat = await _resolve_chat(client, donor_channel)
+        after_id = await _last_message_id_before(client, chat.id, date_from)
+        max_id = await _last_message_id_before(client, chat.id, date_to)
+    except Exception as e:
+        print(f"Error getting chat {donor_channel} for range scrape: {str(e)}")
+        await _forget_peer_on_error(client, donor_channel, e)
+        return
+
+    if max_id <= after_id:
+        print(f"Range scrape for pair {pair_id}: no posts between {date_from} and {date_to}")
+        return
 
-        offset_id = batch[0].id
+    progress = {"offset_id": after_id, "sent": 0, "failed": 0}
+    if await _backfill(client, pair, chat, progress, "range", max_id=max_id):
+        print(
+            f"Range scrape for pair {pair_id} finished: "
+            f"{progress['sent']} sent, {progress['failed']} failed"
+        )
+
+
+async def scrape_filtered(client: Client, pair_id: int, filter_name: str, query: str = ""):
+    """
+    Clone only the posts matching a search filter (see SEARCH_FILTERS) and/or
+    a text query, oldest to newest. Matching is done by Telegram's search, so
+    other messages are never fetched.
+    """
+    messages_filter = SEARCH_FILTERS.get(filter_name)
+    if messages_filter is None:
+        print(f"Unknown search filter for pair {pair_id}: {filter_name}")
+        return
+    pair = await db.get_pair_by_id(pair_id)
+    if not pair:
+        return
+    donor_channel = pair["donor_channel"]
+
+    # Ensure bot can see the target channel
+    if _sender_client:
+        await _ensure_bot_access_to_target(_sender_client, client, pair["target_channel"])
+    try:
+        chat = await _resolve_chat(client, donor_channel)
+    except Exception as e:
+        print(f"Error getting chat {donor_channel} for filtered scrape: {str(e)}")
+        await _forget_peer_on_error(client, donor_channel, e)
+        return
+
+    progress = {"offset_id": 0, "sent": 0, "failed": 0}
+    if await _backfill(
+        client, pair, chat, progress, "filter", query=query, messages_filter=messages_filter
+    ):
+        print(
+            f"Filtered scrape for pair {pair_id} finished: "
+            f"{progress['sent']} sent, {progress['failed']} failed"
+        )
 
 
 async def scrape_first_n_messages(client: Client, pair_id: int, limit: int):
@@ -403,6 +887,7 @@ async def scrape_first_n_messages(client: Client, pair_id: int, limit: int):
         return
     donor_channel = pair["donor_channel"]
     target_channel = pair["target_channel"]
+    copy_mode = bool(pair.get("copy_mode"))
     
     # Ensure bot can see the target channel
     if _sender_client:
@@ -414,129 +899,129 @@ async def scrape_first_n_messages(client: Client, pair_id: int, limit: int):
         return
 
     channel_key = donor_channel
-    buffer = []
-    offset_id = 0
+    taken = 0
 
-    while True:
-        batch = []
-        try:
-            async for message in client.get_chat_history(
-                chat.id, offset_id=offset_id, limit=100
-            ):
-                batch.append(message)
-        except Exception as e:
-            print(f"Error getting chat history for {donor_channel} (first-n): {str(e)}")
-            return
+    try:
+        # Fetch only about as many messages as asked for
+        async for page in _history_pages_oldest_first(
+            client, chat.id, page_size=min(max(limit, 1), 100)
+        ):
+            for message in await _filter_new_messages(channel_key, page):
+                if getattr(message, "service", False):
+                    await db.mark_message_processed(channel_key, message.id)
+                    continue
+                if message.media_group_id:
+                    continue
 
-        if not batch:
-            break
+                try:
+                    await download_and_clone_message(
+                        client,
+                        message,
+                        target_channel,
+                        pair_id,
+                        sender_client=_sender_client,
+                        copy_mode=copy_mode,
+                    )
+                    await db.mark_message_processed(channel_key, message.id)
+                except Exception as e:
+                    _report_clone_error(message, donor_channel, target_channel, e, "first-n")
 
-        for message in batch:
-            if await db.is_message_processed(channel_key, message.id):
-                continue
-            if getattr(message, "service", False):
-                await db.mark_message_processed(channel_key, message.id)
-                continue
-            if message.media_group_id:
-                continue
-            buffer.insert(0, message)
-            if len(buffer) > limit:
-                buffer.pop()
+                taken += 1
+                if taken >= limit:
+                    return
+    except Exception as e:
+        print(f"Error getting chat history for {donor_channel} (first-n): {str(e)}")
+        await _forget_peer_on_error(client, donor_channel, e)
 
-        offset_id = batch[-1].id
 
-    if not buffer:
-        return
+async def download_and_clone_media_group(
+    client: Client,
+    messages: list,
+    target_channel: str,
+    pair_id: int,
+    sender_client: Client | None = None,
+    copy_mode: bool = False,
+    prefetched: list | None = None,
+):
+    """
+    Download and clone a media group.
+    prefetched: files already fetched for each message (None items fall back
+    to file_id); released here.
+    """
+    from utils.button_replacer import replace_markup
 
-    buffer.sort(key=lambda x: x.id)
+    sender = sender_client or _sender_client or client
+    downloaded_media = []
+    if prefetched is not None:
+        downloaded_media = [
+            {'message': msg, 'file_path': file}
+            for msg, file in zip(messages, prefetched)
+        ]
 
-    for message in buffer:
-        try:
-            if await db.is_message_processed(channel_key, message.id):
-                continue
+    try:
+        # Get caption and markup from first message (Telegram usually puts them on the first item)
+        first = messages[0]
+        caption_entities = first.caption_entities
+        caption, caption_parse_mode = await apply_link_rules_to_text(first.caption)
+        if caption_parse_mode:
+            caption_entities = None
+        # Always call replace_markup to support custom buttons
+        reply_markup = await replace_markup(first.reply_markup, pair_id)
+
+        if copy_mode and await copy_media_group_to_target(
+            sender, messages, target_channel, pair_id, caption, reply_markup
+        ):
+            return
+
+        async def download(item):
+            # Download media if needed (for closed channels)
+            msg = item['message']
+            try:
+                if msg.photo or msg.video or msg.document or msg.audio:
+                    item['file_path'] = await download_for_upload(client, msg)
+            except Exception as e:
+                print(f"Warning: Could not download media for message {msg.id}: {str(e)}")
+                # Continue with file_id if download fails
+
+        # Download all media first; media this sender uploaded before goes by file_id
+        if prefetched is None:
+            downloaded_media = [{'message': msg, 'file_path': None} for msg in messages]
+        for item in downloaded_media:
+            item['file_id'] = await cached_upload_file_id(sender, item['message'])
+            if not item['file_id'] and prefetched is None:
+                await download(item)
 
-            await download_and_clone_message(
+        async def send():
+            # Clone using downloaded files
+            await clone_media_group(
                 client,
-                message,
+                downloaded_media,
                 target_channel,
                 pair_id,
-                sender_client=_sender_client,
+                caption,
+                caption_entities,
+                reply_markup,
+                caption_parse_mode,
+                sender_client=sender
             )
-            await db.mark_message_processed(channel_key, message.id)
-        except Exception as e:
-            if "PEER_ID_INVALID" in str(e):
-                print(
-                    f"Error cloning message {message.id}: PEER_ID_INVALID. Target: {target_channel}. Hint: Ensure the BOT is an admin in the target channel (or User is a member if using User mode)."
-                )
-            else:
-                print(
-                    f"Error processing message {message.id} from {donor_channel} (first-n): {str(e)}"
-                )
-            continue
 
-
-async def download_and_clone_media_group(
-    client: Client,
-    messages: list,
-    target_channel: str,
-    pair_id: int
-):
-    """Download and clone a media group"""
-    from utils.button_replacer import replace_markup
-    
-    # Download all media first
-    downloaded_media = []
-    caption = None
-    caption_entities = None
-    caption_parse_mode = None
-    reply_markup = None
-    
-    for i, msg in enumerate(messages):
-        # Download media if needed (for closed channels)
-        file_path = None
         try:
-            if msg.photo or msg.video or msg.document or msg.audio:
-                file_path = await client.download_media(msg)
+            await send()
         except Exception as e:
-            print(f"Warning: Could not download media for message {msg.id}: {str(e)}")
-            # Continue with file_id if download fails
-        
-        # Get caption and markup from first message (Telegram usually puts them on the first item)
-        if i == 0:
-            caption = msg.caption
-            caption_entities = msg.caption_entities
-            caption, caption_parse_mode = await apply_link_rules_to_text(caption)
-            if caption_parse_mode:
-                caption_entities = None
-            # Always call replace_markup to support custom buttons
-            reply_markup = await replace_markup(msg.reply_markup)
-        
-        downloaded_media.append({
-            'message': msg,
-            'file_path': file_path
-        })
-    
-    try:
-        # Clone using downloaded files
-        await clone_media_group(
-            client,
-            downloaded_media,
-            target_channel,
-            pair_id,
-            caption,
-            caption_entities,
-            reply_markup,
-            caption_parse_mode,
-            sender_client=_sender_client
-        )
+            cached = [item for item in downloaded_media if item.get('file_id')]
+            if not cached or not rejected_file_id(e):
+                raise
+            # A cached file_id was rejected: upload those items again
+            for item in cached:
+                await forget_upload(sender, item['message'])
+                item['file_id'] = None
+                if not item.get('file_path'):
+                    await download(item)
+            await send()
     finally:
         # Cleanup downloaded files
         for item in downloaded_media:
-            if item.get('file_path') and os.path.exists(item['file_path']):
-                try:
-                    os.remove(item['file_path'])
-                except:
-                    pass
+            release_download(item.get('file_path'))
 
 
 async def start_monitoring(client: Client):
@@ -548,8 +1033,8 @@ async def start_monitoring(client: Client):
                 await asyncio.sleep(30)  # Wait 30 seconds if no pairs
                 continue
             
-            # Monitor each pair
-            tasks = []
+            # One reader per donor, fanning out to all of its targets
+            donors = {}
             for pair in pairs:
                 if not pair.get('realtime_enabled'):
                     continue
@@ -558,13 +1043,12 @@ async def start_monitoring(client: Client):
                 if _sender_client:
                     await _ensure_bot_access_to_target(_sender_client, client, pair['target_channel'])
 
-                task = monitor_channel(
-                    client,
-                    pair['donor_channel'],
-                    pair['target_channel'],
-                    pair['id']
-                )
-                tasks.append(task)
+                donors.setdefault(pair['donor_channel'], []).append(pair)
+
+            tasks = [
+                monitor_channel(client, donor_channel, donor_pairs)
+                for donor_channel, donor_pairs in donors.items()
+            ]
             
             # Run all monitoring tasks concurrently
             await asyncio.gather(*tasks, return_exceptions=True)
@@ -577,7 +1061,152 @@ async def start_monitoring(client: Client):
             await asyncio.sleep(10)
 
 
+async def refresh_realtime_pairs():
+    """Rebuild the donor chat set served by the realtime update handler"""
+    global _realtime_routes, _realtime_refresh_lock
+    client = _reader_client
+    # The polling loop reads the pairs itself and keeps its own baseline
+    if client is None or not REALTIME_PUSH:
+        return
+    if _realtime_refresh_lock is None:
+        _realtime_refresh_lock = asyncio.Lock()
+
+    async with _realtime_refresh_lock:
+        routes = {}
+        for pair in await db.get_all_pairs():
+            if not pair.get('realtime_enabled'):
+                continue
+            try:
+                chat = await _resolve_chat(client, pair['donor_channel'])
+            except Exception as e:
+                print(f"Realtime: cannot resolve donor {pair['donor_channel']}: {str(e)}")
+                continue
+
+            # Ensure bot can see the target channel
+            if _sender_client:
+                await _ensure_bot_access_to_target(_sender_client, client, pair['target_channel'])
+
+            routes.setdefault(chat.id, []).append(pair)
+
+        _realtime_routes = routes
+        print(f"Realtime: listening to {len(routes)} donor channel(s).")
+
+        # Updates only cover what is posted from now on
+        for chat_id in routes:
+            if chat_id not in _realtime_caught_up:
+                _realtime_caught_up.add(chat_id)
+                asyncio.create_task(_catch_up_realtime(chat_id))
+
+
+async def _catch_up_realtime(chat_id: int):
+    """Clone the posts a donor published while we were not listening"""
+    client = _reader_client
+    pairs = _realtime_routes.get(chat_id)
+    if client is None or not pairs or not REALTIME_PUSH:
+        return
+    donors = {}
+    for pair in pairs:
+        donors.setdefault(pair['donor_channel'], []).append(pair)
+
+    lock = _realtime_locks.setdefault(chat_id, asyncio.Lock())
+    async with lock:
+        for channel_key, donor_pairs in donors.items():
+            try:
+                # A donor that never cloned anything starts from now
+                last_id = await db.get_high_water_mark(channel_key)
+                if not last_id:
+                    continue
+                page = []
+                async for message in client.get_chat_history(chat_id, limit=REALTIME_CATCHUP_LIMIT):
+                    if message.id <= last_id:
+                        break
+                    page.append(message)
+                messages_list = await _filter_new_messages(channel_key, page)
+                if not messages_list:
+                    continue
+                messages_list.reverse()
+                units = await _complete_edge_albums(client, chat_id, channel_key, _group_albums(messages_list))
+                print(f"Realtime: catching up {len(messages_list)} missed message(s) from {channel_key}.")
+                for unit in units:
+                    await _clone_realtime_unit(client, unit, channel_key, donor_pairs)
+            except Exception as e:
+                print(f"Realtime: catch-up failed for {channel_key}: {str(e)}")
+                await _forget_peer_on_error(client, channel_key, e)
+
+
+async def _clone_realtime_unit(client: Client, unit: list, channel_key: str, pairs: list[dict]):
+    """Clone one pushed post or album into every target of a donor"""
+    try:
+        fresh = await _filter_new_messages(channel_key, unit)
+        if not fresh:
+            return
+        # Cached per target; re-checked after a PEER_ID_INVALID or once the TTL ran out
+        if _sender_client:
+            for pair in pairs:
+                await _ensure_bot_access_to_target(_sender_client, client, pair['target_channel'])
+        if not await _fan_out_unit(client, fresh, channel_key, pairs, "realtime"):
+            # No later poll pass in push mode: retry the failed targets on a timer
+            asyncio.create_task(_retry_realtime_unit(fresh, channel_key))
+    except Exception as e:
+        print(f"Error processing message {unit[0].id} from {channel_key} (realtime): {str(e)}")
+
+
+async def _retry_realtime_unit(unit: list, channel_key: str):
+    await asyncio.sleep(REALTIME_RETRY_DELAY)
+    chat_id = unit[0].chat.id
+    # The pairs may have changed meanwhile
+    pairs = [pair for pair in _realtime_routes.get(chat_id, []) if pair['donor_channel'] == channel_key]
+    if not pairs:
+        return
+    lock = _realtime_locks.setdefault(chat_id, asyncio.Lock())
+    async with lock:
+        await _clone_realtime_unit(_reader_client, unit, channel_key, pairs)
+
+
+async def _clone_realtime(chat_id: int, unit: list):
+    pairs = _realtime_routes.get(chat_id)
+    if not pairs:
+        return
+    # Pairs may name the same donor differently; progress is kept per name
+    donors = {}
+    for pair in pairs:
+        donors.setdefault(pair['donor_channel'], []).append(pair)
+    # One donor at a time keeps posts in order
+    lock = _realtime_locks.setdefault(chat_id, asyncio.Lock())
+    async with lock:
+        for channel_key, donor_pairs in donors.items():
+            await _clone_realtime_unit(_reader_client, unit, channel_key, donor_pairs)
+
+
+async def _on_realtime_album(parts: list):
+    await _clone_realtime(parts[0].chat.id, parts)
+
+
+_album_assembler = AlbumAssembler(_on_realtime_album)
+
+
+async def _on_realtime_message(client: Client, message: Message):
+    if message.media_group_id:
+        # Album parts arrive as separate updates; the assembler joins them
+        _album_assembler.add(message)
+        return
+    # Albums still buffered for this donor were posted before this message
+    await _album_assembler.flush_chat(message.chat.id)
+    await _clone_realtime(message.chat.id, [message])
+
+
 def setup_scraper_handler(client: Client):
-    """Setup scraper - start monitoring task"""
-    # Start monitoring in background
-    asyncio.create_task(start_monitoring(client))
+    """Setup scraper - realtime update handler, or the polling loop as a fallback"""
+    global _reader_client
+    _reader_client = client
+
+    if not REALTIME_PUSH:
+        # Start monitoring in background
+        asyncio.create_task(start_monitoring(client))
+        return
+
+    client.add_handler(MessageHandler(
+        _on_realtime_message,
+        filters.create(lambda _, __, message: bool(message.chat) and message.chat.id in _realtime_routes)
+    ))
+    asyncio.create_task(refresh_realtime_pairs())
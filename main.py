@@ -3,6 +3,7 @@ from pyrogram import Client, errors
 from config import BOT_TOKEN, ADMIN_ID, API_ID, API_HASH
 from database import db
 from handlers.scraper import setup_scraper_handler, set_sender_client
+from handlers.scrape_jobs import start_scrape_scheduler
 from handlers.admin_menu import setup_admin_handlers, send_admin_menu, set_user_client
 import os
 import logging
@@ -22,10 +23,8 @@ def setup_logging():
     if level == logging.INFO:
         logging.getLogger("pyrogram").setLevel(logging.WARNING)
 
-async def main():
-    """Main function to start the bot"""
-    setup_logging()
-    
+async def run_bot():
+    """Select the mode and run the clients until stopped"""
     # Initialize database
     print("Initializing database...")
     await db.init_db()
@@ -152,6 +151,7 @@ async def main():
     # Setup scraper on user client (for reading channels)
     print("Setting up scraper...")
     setup_scraper_handler(user_client)
+    start_scrape_scheduler(user_client)
     print("Handlers setup complete!")
     
     # Keep running
@@ -171,6 +171,19 @@ async def main():
         print("Bot stopped.")
 
 
+async def main():
+    """Main function to start the bot"""
+    setup_logging()
+    try:
+        await run_bot()
+    finally:
+        # Commit pending write-behind records, then release pooled connections
+        try:
+            await db.flush()
+        finally:
+            await db.close()
+
+
 if __name__ == "__main__":
     try:
         asyncio.run(main())
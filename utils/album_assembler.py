@@ -0,0 +1,83 @@
+from typing import Awaitable, Callable
+import asyncio
+
+try:
+    from config import ALBUM_QUIET_PERIOD
+except ImportError:
+    ALBUM_QUIET_PERIOD = '1.5'
+
+try:
+    ALBUM_QUIET_PERIOD = max(0.1, float(ALBUM_QUIET_PERIOD))
+except (TypeError, ValueError):
+    ALBUM_QUIET_PERIOD = 1.5
+
+# Telegram albums have at most 10 items
+ALBUM_MAX_PARTS = 10
+
+
+class AlbumAssembler:
+    """
+    Collects media group parts that arrive as separate updates.
+    An album is handed to on_album (parts sorted by id) once no new part
+    arrived for quiet_period seconds, or as soon as max_parts are buffered.
+    """
+
+    def __init__(
+        self,
+        on_album: Callable[[list], Awaitable[None]],
+        quiet_period: float = ALBUM_QUIET_PERIOD,
+        max_parts: int = ALBUM_MAX_PARTS,
+    ):
+        self._on_album = on_album
+        self.quiet_period = quiet_period
+        self.max_parts = max_parts
+        self._albums: dict[tuple, list] = {}
+        self._timers: dict[tuple, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def add(self, message):
+        """Buffer one album part and (re)start the quiet-period timer"""
+        key = (message.chat.id, message.media_group_id)
+        parts = self._albums.setdefault(key, [])
+        if any(part.id == message.id for part in parts):
+            return
+        parts.append(message)
+
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        if len(parts) >= self.max_parts:
+            self._start(key)
+        else:
+            loop = asyncio.get_running_loop()
+            self._timers[key] = loop.call_later(self.quiet_period, self._start, key)
+
+    async def flush_chat(self, chat_id: int):
+        """Hand over every album buffered for a chat right away and wait for it"""
+        for key in [key for key in self._albums if key[0] == chat_id]:
+            parts = self._take(key)
+            if parts:
+                await self._run(parts)
+
+    def _take(self, key: tuple) -> list | None:
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        parts = self._albums.pop(key, None)
+        if parts:
+            parts.sort(key=lambda x: x.id)
+        return parts
+
+    def _start(self, key: tuple):
+        parts = self._take(key)
+        if not parts:
+            return
+        task = asyncio.create_task(self._run(parts))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, parts: list):
+        try:
+            await self._on_album(parts)
+        except Exception as e:
+            print(f"Error cloning album {parts[0].media_group_id}: {str(e)}")
@@ -3,23 +3,14 @@ from database import db
 import re
 
 
-async def replace_markup(markup: InlineKeyboardMarkup | None) -> InlineKeyboardMarkup | None:
-    """
-    Build buttons based on global button rules.
-    If custom_buttons_mode is enabled, the original donor buttons are completely ignored
-    and replaced with our custom buttons.
-    Otherwise, we only replace donor buttons IF they existed.
-    Supports up to 3 buttons.
-    """
-    rules = await db.get_all_button_rules()
-    if not rules:
-        return markup
+# Markups built from the button rules: pair_id (None = global set) -> markup
+_markups: dict[int | None, InlineKeyboardMarkup] = {}
+_markups_version: int | None = None
 
-    rule = rules[0]
-    # custom_mode = bool(rule.get("custom_buttons_mode", 0)) # We ignore this toggle now as per user request
-    mode = (rule.get("mode") or "one").lower()
 
-    # If rules exist, we proceed. We no longer check if donor had buttons.
+def _build_markup(rule: dict) -> InlineKeyboardMarkup | None:
+    """Turn one button rule into a single row of up to 3 buttons"""
+    mode = (rule.get("mode") or "one").lower()
 
     buttons = []
     
@@ -44,13 +35,52 @@ async def replace_markup(markup: InlineKeyboardMarkup | None) -> InlineKeyboardM
             buttons.append(InlineKeyboardButton(text3, url=url3))
 
     if not buttons:
-        # If no buttons configured, return original markup
-        return markup
+        return None
 
     # Return as a single row of buttons
     return InlineKeyboardMarkup([buttons])
 
 
+async def _get_markups() -> dict[int | None, InlineKeyboardMarkup]:
+    """Cached markups, rebuilt only after the button rules changed"""
+    global _markups, _markups_version
+    if _markups_version != db.button_rules_version:
+        # Read the version first: a change during the load triggers another rebuild
+        version = db.button_rules_version
+        markups = {}
+        for rule in await db.get_all_button_rules():
+            scope = rule.get("pair_id")
+            if scope in markups:
+                continue
+            markup = _build_markup(rule)
+            if markup:
+                markups[scope] = markup
+        _markups = markups
+        _markups_version = version
+    return _markups
+
+
+async def replace_markup(
+    markup: InlineKeyboardMarkup | None,
+    pair_id: int | None = None,
+) -> InlineKeyboardMarkup | None:
+    """
+    Build buttons based on button rules: the pair's own set if it has one,
+    otherwise the global set.
+    If custom_buttons_mode is enabled, the original donor buttons are completely ignored
+    and replaced with our custom buttons.
+    Otherwise, we only replace donor buttons IF they existed.
+    Supports up to 3 buttons.
+    """
+    # custom_mode = bool(rule.get("custom_buttons_mode", 0)) # We ignore this toggle now as per user request
+    # If rules exist, we proceed. We no longer check if donor had buttons.
+    markups = await _get_markups()
+    if pair_id is not None and pair_id in markups:
+        return markups[pair_id]
+    # If no buttons configured, return original markup
+    return markups.get(None, markup)
+
+
 def _is_match(pattern: str, text: str) -> bool:
     if not text:
         return False
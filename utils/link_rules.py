@@ -0,0 +1,137 @@
+from typing import Optional
+import re
+
+from database import db
+
+
+def _markdown_links_to_html(replacement: str) -> str:
+    # Convert [text](url) to <a href="url">text</a>
+    return re.sub(
+        r'\[([^\]]+)\]\(([^)]+)\)',
+        r'<a href="\2">\1</a>',
+        replacement
+    )
+
+
+def _overlaps(a: str, b: str) -> bool:
+    """Whether a match of a and a match of b can share characters in some text"""
+    a, b = a.casefold(), b.casefold()
+    if not a or not b:
+        return False
+    if a in b or b in a:
+        return True
+    shortest = min(len(a), len(b))
+    return any(a.endswith(b[:n]) or b.endswith(a[:n]) for n in range(1, shortest))
+
+
+class _PlainRuleGroup:
+    """
+    Consecutive plain rules matched in one pass by a single alternation regex.
+    A rule only joins when that gives the same result as applying the rules
+    one by one: see accepts().
+    """
+
+    def __init__(self):
+        self.patterns: list[str] = []
+        self.replacements: list[str] = []
+        self.regex = None
+
+    def accepts(self, pattern: str) -> bool:
+        for other_pattern, other_replacement in zip(self.patterns, self.replacements):
+            # Overlapping patterns would compete for the same text, and a pattern
+            # found in (or next to) an earlier replacement used to chain on it;
+            # after a deletion a pattern could match across the gap
+            if (
+                not other_replacement
+                or _overlaps(pattern, other_pattern)
+                or _overlaps(pattern, other_replacement)
+            ):
+                return False
+        return True
+
+    def add(self, pattern: str, replacement: str):
+        self.patterns.append(pattern)
+        self.replacements.append(replacement)
+
+    def compile(self):
+        self.regex = re.compile(
+            "|".join(f"({re.escape(pattern)})" for pattern in self.patterns),
+            re.IGNORECASE,
+        )
+
+    def apply(self, text: str) -> str:
+        # Each pattern is one group, so lastindex tells which rule matched
+        return self.regex.sub(lambda m: self.replacements[m.lastindex - 1], text)
+
+
+class CompiledLinkRules:
+    """Link rules prepared once: plain patterns grouped, regex rules precompiled"""
+
+    def __init__(self, rules: list[dict], version: int):
+        self.version = version
+        self.use_html = False
+        # Rules keep their order: each step is a _PlainRuleGroup or (regex, replacement)
+        self.steps: list = []
+
+        group = None
+        for rule in rules:
+            pattern = (rule.get("pattern") or "").strip()
+            replacement = rule.get("replacement") or ""
+            if not pattern:
+                continue
+
+            # Check if replacement contains markdown-style link
+            if "[" in replacement and "](" in replacement:
+                self.use_html = True
+                replacement = _markdown_links_to_html(replacement)
+
+            if pattern.startswith("regex:"):
+                try:
+                    regex = re.compile(pattern[6:], re.IGNORECASE)
+                except Exception:
+                    continue
+                group = None
+                self.steps.append((regex, replacement))
+            elif "\\" in replacement:
+                # re.sub template (backslash escapes, \g<0>): applied on its own
+                group = None
+                self.steps.append((re.compile(re.escape(pattern), re.IGNORECASE), replacement))
+            else:
+                if group is None or not group.accepts(pattern):
+                    group = _PlainRuleGroup()
+                    self.steps.append(group)
+                group.add(pattern, replacement)
+
+        for step in self.steps:
+            if isinstance(step, _PlainRuleGroup):
+                step.compile()
+
+    def apply(self, text: Optional[str]) -> tuple[Optional[str], Optional[str]]:
+        if not text or not self.steps:
+            return text, None
+
+        result = text
+        for step in self.steps:
+            if isinstance(step, _PlainRuleGroup):
+                result = step.apply(result)
+                continue
+            regex, replacement = step
+            try:
+                result = regex.sub(replacement, result)
+            except Exception:
+                continue
+
+        return result, ("html" if self.use_html else None)
+
+
+_compiled: CompiledLinkRules | None = None
+
+
+async def get_compiled_link_rules() -> CompiledLinkRules:
+    """Compiled rule set, rebuilt only after the link rules table changed"""
+    global _compiled
+    if _compiled is None or _compiled.version != db.link_rules_version:
+        # Read the version first: a change during the load triggers another rebuild
+        version = db.link_rules_version
+        _compiled = CompiledLinkRules(await db.get_all_link_rules(), version)
+    return _compiled
@@ -1,5 +1,6 @@
 from typing import List, Optional
 from pyrogram import Client, enums
+from pyrogram.errors import FloodWait
 from pyrogram.types import Message, InputMediaPhoto, InputMediaVideo, InputMediaDocument, InputMediaAudio
 from utils.button_replacer import replace_markup
 from config import FLOODWAIT_RETRY_DELAY, MAX_FLOODWAIT_RETRIES
@@ -7,45 +8,65 @@ try:
     MAX_FLOODWAIT_RETRIES = int(MAX_FLOODWAIT_RETRIES)
     FLOODWAIT_RETRY_DELAY = int(FLOODWAIT_RETRY_DELAY)
 except:
-    MAX_FLOODWAIT_RETRIES = 5
+    MAX_FLOODWAIT_RETRIES = 20
     FLOODWAIT_RETRY_DELAY = 1
 from utils.license_check import verify_license
 from config import SNIFFER_LICENSE
 from database import db
+from utils.rate_limiter import rate_limiter
+from utils.link_rules import get_compiled_link_rules
+from utils.transcoder import video_note_cache
+try:
+    from config import IN_MEMORY_TRANSFER_LIMIT_MB
+except ImportError:
+    IN_MEMORY_TRANSFER_LIMIT_MB = '20'
+try:
+    IN_MEMORY_TRANSFER_LIMIT = int(float(IN_MEMORY_TRANSFER_LIMIT_MB) * 1024 * 1024)
+except (TypeError, ValueError):
+    IN_MEMORY_TRANSFER_LIMIT = 20 * 1024 * 1024
 import asyncio
 import re
 import os
-import subprocess
-import shutil
 
-# Check for local ffmpeg
-LOCAL_FFMPEG = os.path.join(os.getcwd(), 'ffmpeg.exe')
-FFMPEG_CMD = LOCAL_FFMPEG if os.path.exists(LOCAL_FFMPEG) else 'ffmpeg'
+# (sender, donor chat id) pairs where a server-side copy failed this session
+_copy_unavailable: set[tuple[int, int]] = set()
+
+# Copy errors that hold for every message of the donor: forwarding is
+# restricted, or the sender cannot see the donor at all
+COPY_UNAVAILABLE_ERRORS = (
+    "CHAT_FORWARDS_RESTRICTED",
+    "CHANNEL_PRIVATE",
+    "CHANNEL_INVALID",
+)
+# Raised for the donor as well as for the target (e.g. the bot is not an
+# admin of the target yet); donor-wide only if the sender cannot read the donor
+COPY_AMBIGUOUS_ERRORS = (
+    "CHAT_ADMIN_REQUIRED",
+    "PEER_ID_INVALID",
+)
+
+# How many files were passed through memory / spooled to disk this session
+transfer_stats = {"in_memory": 0, "on_disk": 0}
+
+# (sender user id, source file_unique_id) -> file_id of the sender's upload
+_uploaded_file_ids: dict[tuple[int, str], str] = {}
+_sender_ids: dict[int, int] = {}
 
-def convert_video_note(input_path: str, output_path: str) -> bool:
+# Media kinds in the order download_and_clone_message checks them
+_UPLOAD_KINDS = ("photo", "video", "document", "audio", "voice", "video_note")
+
+
+def _flood_wait_seconds(e: Exception) -> Optional[float]:
     """
-    Convert video to a 1:1 round video note format (384x384).
-    Returns True if successful, False otherwise.
+    Seconds Telegram asked to wait, or None if e is not a flood wait.
+    Other flood errors (PEER_FLOOD, ...) do not clear by waiting and are raised.
     """
-    try:
-        cmd = [
-            FFMPEG_CMD, '-y',
-            '-i', input_path,
-            '-vf', 'crop=min(iw,ih):min(iw,ih),scale=384:384',
-            '-c:v', 'libx264',
-            '-preset', 'fast',
-            '-crf', '26',
-            '-c:a', 'aac',
-            '-b:a', '64k',
-            '-t', '59',
-            '-pix_fmt', 'yuv420p',
-            output_path
-        ]
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        return True
-    except Exception as e:
-        print(f"FFmpeg conversion error: {e}")
-        return False
+    if isinstance(e, FloodWait):
+        return float(e.value)
+    match = re.search(r'FLOOD_WAIT_(\d+)', str(e))
+    if match:
+        return float(match.group(1)) + FLOODWAIT_RETRY_DELAY
+    return None
 
 
 async def send_message_with_retry(client: Client, chat_id, **kwargs):
@@ -55,7 +76,9 @@ async def send_message_with_retry(client: Client, chat_id, **kwargs):
     # Determine correct send function
     send_fn = client.send_message
     
-    if 'photo' in kwargs:
+    if 'from_chat_id' in kwargs:
+        send_fn = client.copy_message
+    elif 'photo' in kwargs:
         send_fn = client.send_photo
     elif 'video' in kwargs:
         send_fn = client.send_video
@@ -93,36 +116,33 @@ async def send_message_with_retry(client: Client, chat_id, **kwargs):
             else:
                 kwargs.pop('parse_mode')
 
-    retries = 0
-    while retries < MAX_FLOODWAIT_RETRIES:
+    # The limiter holds the account for as long as Telegram asked, so a
+    # flood wait is retried up to MAX_FLOODWAIT_RETRIES times before failing
+    flood_retries = 0
+    peer_retried = False
+    while True:
+        await rate_limiter.acquire(client, chat_id)
         try:
             return await send_fn(chat_id=chat_id, **kwargs)
         except Exception as e:
             error_msg = str(e)
             
-            if "Invalid parse mode" in error_msg:
+            if "Invalid parse mode" in error_msg and 'parse_mode' in kwargs:
                 print(f"Parse mode error, retrying without parse_mode: {error_msg}")
-                kwargs.pop('parse_mode', None)
-                return await send_fn(chat_id=chat_id, **kwargs)
+                kwargs.pop('parse_mode')
+                continue
 
-            if "FLOOD_WAIT" in error_msg or "flood" in error_msg.lower():
-                wait_time = FLOODWAIT_RETRY_DELAY
-                try:
-                    match = re.search(r'(\d+)', error_msg)
-                    if match:
-                        wait_time = min(int(match.group(1)) + 1, 60)
-                except:
-                    pass
-                
-                retries += 1
-                if retries < MAX_FLOODWAIT_RETRIES:
-                    await asyncio.sleep(wait_time)
-                    continue
+            wait_time = _flood_wait_seconds(e)
+            if wait_time is not None and flood_retries < MAX_FLOODWAIT_RETRIES:
+                flood_retries += 1
+                # The limiter holds every send of this account until the wait is over
+                rate_limiter.flood_wait(client, chat_id, wait_time)
+                continue
             
-            if "PEER_ID_INVALID" in error_msg and retries == 0:
+            if "PEER_ID_INVALID" in error_msg and not peer_retried:
+                peer_retried = True
                 try:
                     await client.get_chat(chat_id)
-                    retries += 1
                     continue
                 except Exception as resolve_error:
                     print(f"Failed to resolve peer {chat_id}: {resolve_error}")
@@ -130,60 +150,225 @@ async def send_message_with_retry(client: Client, chat_id, **kwargs):
             raise
 
 
+async def edit_reply_markup_with_retry(client: Client, chat_id, message_id: int, reply_markup):
+    """Set the buttons of a sent message, paced by the same limiter as sends"""
+    flood_retries = 0
+    while True:
+        await rate_limiter.acquire(client, chat_id)
+        try:
+            return await client.edit_message_reply_markup(
+                chat_id=chat_id,
+                message_id=message_id,
+                reply_markup=reply_markup
+            )
+        except Exception as e:
+            wait_time = _flood_wait_seconds(e)
+            if wait_time is None or flood_retries >= MAX_FLOODWAIT_RETRIES:
+                raise
+            flood_retries += 1
+            rate_limiter.flood_wait(client, chat_id, wait_time)
+
+
 async def apply_link_rules_to_text(text: Optional[str]) -> tuple[Optional[str], Optional[str]]:
     """Apply link replacement rules to text. Returns (modified_text, parse_mode)"""
     if not text:
         return text, None
 
-    rules = await db.get_all_link_rules()
-    if not rules:
-        return text, None
+    rules = await get_compiled_link_rules()
+    return rules.apply(text)
+
+
+def _media_file_size(message: Message) -> Optional[int]:
+    media = (
+        message.photo or message.video or message.document
+        or message.audio or message.voice or message.video_note
+    )
+    return getattr(media, "file_size", None) if media else None
+
+
+async def download_for_upload(client: Client, message: Message):
+    """
+    Download media for re-upload. Files up to IN_MEMORY_TRANSFER_LIMIT stay in
+    memory (BytesIO), bigger or unknown-size files are spooled to disk.
+    """
+    size = _media_file_size(message)
+    if size is not None and size <= IN_MEMORY_TRANSFER_LIMIT:
+        data = await client.download_media(message, in_memory=True)
+        transfer_stats["in_memory"] += 1
+        return data
+    path = await client.download_media(message)
+    transfer_stats["on_disk"] += 1
+    return path
 
-    result = text
-    use_html = False
-
-    for rule in rules:
-        pattern = (rule.get("pattern") or "").strip()
-        replacement = rule.get("replacement") or ""
-        if not pattern:
-            continue
-
-        # Check if replacement contains markdown-style link
-        if "[" in replacement and "](" in replacement:
-            use_html = True
-            # Convert [text](url) to <a href="url">text</a>
-            replacement = re.sub(
-                r'\[([^\]]+)\]\(([^)]+)\)',
-                r'<a href="\2">\1</a>',
-                replacement
-            )
 
-        if pattern.startswith("regex:"):
+def release_download(file):
+    """Free a result of download_for_upload"""
+    if not file:
+        return
+    if isinstance(file, str):
+        if os.path.exists(file):
             try:
-                regex = re.compile(pattern[6:], re.IGNORECASE)
-            except Exception:
-                continue
-            if regex.search(result):
-                result = regex.sub(replacement, result)
-        else:
-            if pattern.lower() in result.lower():
-                try:
-                    result = re.sub(
-                        re.escape(pattern),
-                        replacement,
-                        result,
-                        flags=re.IGNORECASE,
-                    )
-                except Exception:
-                    continue
+                os.remove(file)
+            except:
+                pass
+    else:
+        file.close()
+
+
+def _uploadable_media(message: Message):
+    for kind in _UPLOAD_KINDS:
+        media = getattr(message, kind, None)
+        if media:
+            return kind, media
+    return None, None
+
+
+async def _upload_key(sender: Client, message: Message) -> Optional[tuple[int, str]]:
+    _, media = _uploadable_media(message)
+    if not media:
+        return None
+    sender_id = _sender_ids.get(id(sender))
+    if sender_id is None:
+        sender_id = _sender_ids[id(sender)] = (await sender.get_me()).id
+    return sender_id, media.file_unique_id
+
+
+async def cached_upload_file_id(sender: Client, message: Message) -> Optional[str]:
+    """file_id of the same media uploaded earlier by this sender, if any"""
+    key = await _upload_key(sender, message)
+    if key is None:
+        return None
+    file_id = _uploaded_file_ids.get(key)
+    if file_id is None:
+        file_id = await db.get_uploaded_file_id(*key)
+        if file_id:
+            _uploaded_file_ids[key] = file_id
+    return file_id
+
+
+async def remember_upload(sender: Client, source: Message, sent: Optional[Message]):
+    """Record the file_id the sender got for the source media"""
+    try:
+        sent_kind, sent_media = _uploadable_media(sent) if sent else (None, None)
+        source_kind, _ = _uploadable_media(source)
+        # Telegram may store the upload as another kind (e.g. a document as a
+        # video); such a file_id cannot be resent as the source kind
+        if not sent_media or sent_kind != source_kind:
+            return
+        key = await _upload_key(sender, source)
+        if key is None:
+            return
+        _uploaded_file_ids[key] = sent_media.file_id
+        await db.save_uploaded_file_id(*key, sent_media.file_id)
+    except Exception as e:
+        print(f"Could not remember upload of message {source.id}: {str(e)}")
+
+
+def rejected_file_id(e: Exception) -> bool:
+    """Whether Telegram (or Pyrogram, for a file_id of another kind) refused a file_id we sent"""
+    error_msg = str(e)
+    if isinstance(e, ValueError) and "file id" in error_msg:
+        return True
+    return any(code in error_msg for code in ("FILE_ID_INVALID", "MEDIA_EMPTY", "MEDIA_INVALID", "FILE_REFERENCE"))
+
+
+async def forget_upload(sender: Client, message: Message):
+    """A cached file_id was rejected: upload the media again next time"""
+    try:
+        key = await _upload_key(sender, message)
+        if key is None:
+            return
+        _uploaded_file_ids.pop(key, None)
+        await db.save_uploaded_file_id(*key, None)
+    except Exception as e:
+        print(f"Could not forget upload of message {message.id}: {str(e)}")
+
+
+def can_copy_message(sender: Client, message: Message) -> bool:
+    """Whether a server-side copy of the message is worth trying"""
+    if getattr(message, "has_protected_content", False):
+        return False
+    return (id(sender), message.chat.id) not in _copy_unavailable
+
+
+async def _sender_reads_donor(sender: Client, message: Message) -> bool:
+    try:
+        await sender.get_messages(message.chat.id, message.id)
+        return True
+    except FloodWait:
+        # Says nothing about access
+        return True
+    except Exception:
+        return False
 
-    # If we're using HTML, escape special chars in text parts (not in our HTML tags)
-    if use_html:
-        # Simple approach: escape < and > that are not part of our <a> tags
-        # This is a basic implementation - for full safety we'd need proper HTML parsing
-        pass  # Skip escaping for now since replacement already has proper HTML
 
-    return result, ("html" if use_html else None)
+async def _copy_failed(sender: Client, message: Message, e: Exception):
+    """
+    Fall back to download for this message; if the error is about the donor
+    itself, remember that the sender cannot copy from it at all.
+    """
+    # Pyrogram's own lookups raise e.g. ValueError("Peer id invalid: ...")
+    error_msg = str(e).upper().replace(" ", "_")
+    donor_wide = any(code in error_msg for code in COPY_UNAVAILABLE_ERRORS)
+    if not donor_wide and any(code in error_msg for code in COPY_AMBIGUOUS_ERRORS):
+        donor_wide = not await _sender_reads_donor(sender, message)
+    if not donor_wide:
+        print(
+            f"Copy of message {message.id} from {message.chat.id} failed: {str(e)}. "
+            f"Falling back to download and re-upload for this message."
+        )
+        return
+    key = (id(sender), message.chat.id)
+    if key not in _copy_unavailable:
+        _copy_unavailable.add(key)
+        print(
+            f"Copy of message {message.id} from {message.chat.id} failed: {str(e)}. "
+            f"Falling back to download and re-upload for this donor."
+        )
+
+
+async def copy_media_group_to_target(
+    sender: Client,
+    messages: list,
+    target_channel: str,
+    pair_id: int,
+    caption: Optional[str] = None,
+    reply_markup = None,
+) -> bool:
+    """Copy an album server-side. Returns False if it has to be downloaded instead"""
+    first = messages[0]
+    if not all(can_copy_message(sender, msg) for msg in messages):
+        return False
+
+    # Keep the original caption (with entities) unless link rules changed it
+    captions = caption if caption != first.caption else None
+
+    flood_retries = 0
+    while True:
+        await rate_limiter.acquire(sender, target_channel, len(messages))
+        try:
+            result = await sender.copy_media_group(
+                chat_id=target_channel,
+                from_chat_id=first.chat.id,
+                message_id=first.id,
+                captions=captions,
+            )
+            break
+        except Exception as e:
+            wait_time = _flood_wait_seconds(e)
+            if wait_time is not None:
+                if flood_retries >= MAX_FLOODWAIT_RETRIES:
+                    raise
+                flood_retries += 1
+                rate_limiter.flood_wait(sender, target_channel, wait_time)
+                continue
+            await _copy_failed(sender, first, e)
+            return False
+
+    if result and reply_markup:
+        await edit_reply_markup_with_retry(sender, target_channel, result[0].id, reply_markup)
+    await db.increment_statistics(pair_id)
+    return True
 
 
 async def download_and_clone_message(
@@ -192,17 +377,20 @@ async def download_and_clone_message(
     target_channel: str,
     pair_id: int,
     sender_client: Client | None = None,
+    copy_mode: bool = False,
+    prefetched = None,
 ):
-    """Download media and clone message to target channel"""
+    """
+    Download media and clone message to target channel.
+    prefetched: media already fetched by download_for_upload; released here.
+    """
     sender = sender_client or client
     
     # ALWAYS get button markup - this is critical for adding buttons to every post
-    reply_markup = await replace_markup(message.reply_markup)
-    
-    if message.media_group_id:
-        return None
+    reply_markup = await replace_markup(message.reply_markup, pair_id)
     
-    if getattr(message, "service", False):
+    if message.media_group_id or getattr(message, "service", False):
+        release_download(prefetched)
         return
 
     has_supported_type = bool(
@@ -217,6 +405,7 @@ async def download_and_clone_message(
         or message.caption
     )
     if not has_supported_type:
+        release_download(prefetched)
         return
 
     caption = message.caption
@@ -232,13 +421,61 @@ async def download_and_clone_message(
     if text_parse_mode:
         text_entities = None
 
-    file_path = None
+    has_file = bool(
+        message.photo or message.video or message.document
+        or message.audio or message.voice or message.video_note
+    )
+    if copy_mode and has_file and can_copy_message(sender, message):
+        # Server-side copy: no download and no re-upload
+        try:
+            await send_message_with_retry(
+                sender,
+                chat_id=target_channel,
+                from_chat_id=message.chat.id,
+                message_id=message.id,
+                caption=caption,
+                caption_entities=caption_entities,
+                parse_mode=caption_parse_mode,
+                reply_markup=reply_markup
+            )
+            await db.increment_statistics(pair_id)
+            release_download(prefetched)
+            return
+        except Exception as e:
+            if _flood_wait_seconds(e) is not None:
+                release_download(prefetched)
+                raise
+            await _copy_failed(sender, message, e)
+
+    file_path = prefetched
     try:
-        if message.photo or message.video or message.document or message.audio or message.voice:
-            file_path = await client.download_media(message)
+        kind, _ = _uploadable_media(message)
+        cached_file_id = await cached_upload_file_id(sender, message) if kind else None
+        if cached_file_id:
+            # Uploaded before by this sender: send by file_id, no transfer at all
+            try:
+                await send_message_with_retry(
+                    sender,
+                    chat_id=target_channel,
+                    caption=caption,
+                    caption_entities=caption_entities,
+                    parse_mode=caption_parse_mode,
+                    reply_markup=reply_markup,
+                    **{kind: cached_file_id}
+                )
+                await db.increment_statistics(pair_id)
+                return
+            except Exception as e:
+                if not rejected_file_id(e):
+                    raise
+                await forget_upload(sender, message)
+
+        if not file_path and (message.photo or message.video or message.document or message.audio or message.voice):
+            file_path = await download_for_upload(client, message)
         
+        sent = None
         if message.photo:
-            await send_message_with_retry(
+            sent = await send_message_with_retry(
                 sender,
                 chat_id=target_channel,
                 photo=file_path if file_path else message.photo.file_id,
@@ -248,7 +485,7 @@ async def download_and_clone_message(
                 reply_markup=reply_markup
             )
         elif message.video:
-            await send_message_with_retry(
+            sent = await send_message_with_retry(
                 sender,
                 chat_id=target_channel,
                 video=file_path if file_path else message.video.file_id,
@@ -258,7 +495,7 @@ async def download_and_clone_message(
                 reply_markup=reply_markup
             )
         elif message.document:
-            await send_message_with_retry(
+            sent = await send_message_with_retry(
                 sender,
                 chat_id=target_channel,
                 document=file_path if file_path else message.document.file_id,
@@ -268,7 +505,7 @@ async def download_and_clone_message(
                 reply_markup=reply_markup
             )
         elif message.audio:
-            await send_message_with_retry(
+            sent = await send_message_with_retry(
                 sender,
                 chat_id=target_channel,
                 audio=file_path if file_path else message.audio.file_id,
@@ -278,7 +515,7 @@ async def download_and_clone_message(
                 reply_markup=reply_markup
             )
         elif message.voice:
-            await send_message_with_retry(
+            sent = await send_message_with_retry(
                 sender,
                 chat_id=target_channel,
                 voice=file_path if file_path else message.voice.file_id,
@@ -288,36 +525,36 @@ async def download_and_clone_message(
                 reply_markup=reply_markup
             )
         elif message.video_note:
-            note_path = file_path
-            if not note_path:
-                note_path = await client.download_media(message)
-                
-            final_path = note_path
-            converted_path = f"{note_path}_converted.mp4"
-            
-            if convert_video_note(note_path, converted_path):
-                final_path = converted_path
-            else:
-                print("Video note conversion failed. Trying raw send.")
+            # Same round video seen before: reuse its conversion, skip the download
+            unique_id = message.video_note.file_unique_id
+            note_path = None
+            # The cached file must not be evicted before the upload is done
+            video_note_cache.pin(unique_id)
+            try:
+                final_path = video_note_cache.get(unique_id)
+                if not final_path:
+                    note_path = file_path
+                    if not note_path:
+                        note_path = await client.download_media(message)
 
-            await send_message_with_retry(
-                sender,
-                chat_id=target_channel,
-                video_note=final_path,
-                reply_markup=reply_markup
-            )
-            
-            if final_path != note_path and os.path.exists(final_path):
-                try:
-                    os.remove(final_path)
-                except:
-                    pass
-            
-            if not file_path and note_path and os.path.exists(note_path):
-                try:
-                    os.remove(note_path)
-                except:
-                    pass
+                    final_path = await video_note_cache.convert(unique_id, note_path)
+                    if not final_path:
+                        print("Video note conversion failed. Trying raw send.")
+                        final_path = note_path
+
+                sent = await send_message_with_retry(
+                    sender,
+                    chat_id=target_channel,
+                    video_note=final_path,
+                    reply_markup=reply_markup
+                )
+            finally:
+                video_note_cache.unpin(unique_id)
+                if not file_path and note_path and os.path.exists(note_path):
+                    try:
+                        os.remove(note_path)
+                    except:
+                        pass
 
         elif message.sticker:
             await send_message_with_retry(
@@ -339,16 +576,14 @@ async def download_and_clone_message(
             return
         
         await db.increment_statistics(pair_id)
+        if kind:
+            await remember_upload(sender, message, sent)
         
     except Exception as e:
         print(f"Error cloning message {message.id}: {str(e)}")
         raise
     finally:
-        if file_path and os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except:
-                pass
+        release_download(file_path)
 
 
 async def clone_message(client: Client, message: Message, target_channel: str, pair_id: int):
@@ -383,9 +618,16 @@ async def clone_media_group(
         if caption_parse_mode.lower() == 'html':
             actual_parse_mode = enums.ParseMode.HTML
     
+    uploaded = []
     for i, item in enumerate(messages_data):
         msg = item.get('message') if isinstance(item, dict) else item
         file_path = item.get('file_path') if isinstance(item, dict) else None
+        # file_id of the sender's own earlier upload of this media
+        cached_file_id = item.get('file_id') if isinstance(item, dict) else None
+        was_uploaded = bool(file_path) and not cached_file_id
+        if cached_file_id:
+            file_path = cached_file_id
+        media_count = len(media)
         
         is_first = i == 0
         current_caption = caption if is_first and caption else None
@@ -419,39 +661,35 @@ async def clone_media_group(
                 caption_entities=current_caption_entities,
                 parse_mode=actual_parse_mode if current_caption else None,
             ))
+
+        if was_uploaded and len(media) > media_count:
+            uploaded.append((media_count, msg))
     
     if media:
         try:
-            retries = 0
-            while retries < MAX_FLOODWAIT_RETRIES:
+            flood_retries = 0
+            while True:
+                # An album counts as one message per item
+                await rate_limiter.acquire(sender, target_channel, len(media))
                 try:
                     result = await sender.send_media_group(
                         chat_id=target_channel,
                         media=media
                     )
-                    if result and reply_markup:
-                        await sender.edit_message_reply_markup(
-                            chat_id=target_channel,
-                            message_id=result[0].id,
-                            reply_markup=reply_markup
-                        )
                     break
                 except Exception as e:
-                    error_msg = str(e)
-                    if "FLOOD_WAIT" in error_msg or "flood" in error_msg.lower():
-                        wait_time = FLOODWAIT_RETRY_DELAY
-                        try:
-                            match = re.search(r'(\d+)', error_msg)
-                            if match:
-                                wait_time = min(int(match.group(1)) + 1, 60)
-                        except:
-                            pass
-                        retries += 1
-                        if retries < MAX_FLOODWAIT_RETRIES:
-                            await asyncio.sleep(wait_time)
-                            continue
-                    raise
+                    wait_time = _flood_wait_seconds(e)
+                    if wait_time is None or flood_retries >= MAX_FLOODWAIT_RETRIES:
+                        raise
+                    flood_retries += 1
+                    rate_limiter.flood_wait(sender, target_channel, wait_time)
+            # Outside the send loop: a flood wait here must not send the album again
+            if result and reply_markup:
+                await edit_reply_markup_with_retry(sender, target_channel, result[0].id, reply_markup)
             await db.increment_statistics(pair_id)
+            for index, msg in uploaded:
+                if result and index < len(result):
+                    await remember_upload(sender, msg, result[index])
         except Exception as e:
             print(f"Error cloning media group: {str(e)}")
             raise
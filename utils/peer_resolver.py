@@ -0,0 +1,160 @@
+import asyncio
+import time
+
+from pyrogram import Client
+from database import db
+
+try:
+    from config import PEER_CACHE_TTL, PEER_NEGATIVE_TTL
+except ImportError:
+    PEER_CACHE_TTL = '86400'
+    PEER_NEGATIVE_TTL = '300'
+
+try:
+    PEER_CACHE_TTL = float(PEER_CACHE_TTL)
+    PEER_NEGATIVE_TTL = float(PEER_NEGATIVE_TTL)
+except (TypeError, ValueError):
+    PEER_CACHE_TTL = 86400.0
+    PEER_NEGATIVE_TTL = 300.0
+
+# Dialogs walked when a numeric id is unknown to the session
+DIALOG_SCAN_LIMIT = 2000
+
+# Errors meaning the reference itself is bad; only these are cached as failures,
+# so a flood wait or a network error is simply retried on the next call
+DEFINITIVE_ERRORS = (
+    "USERNAME_NOT_OCCUPIED",
+    "USERNAME_INVALID",
+    "CHANNEL_INVALID",
+    "CHANNEL_PRIVATE",
+    "PEER_ID_INVALID",
+)
+
+
+class PeerResolveError(Exception):
+    """A cached failure: the reference was not resolvable a moment ago"""
+
+
+class ResolvedChat:
+    """What callers need from a resolved chat"""
+
+    def __init__(self, chat_id: int, username: str | None = None):
+        self.id = chat_id
+        self.username = username
+
+
+def normalize_chat_ref(chat_ref) -> str:
+    return (
+        str(chat_ref)
+        .strip()
+        .replace("−", "-")
+        .replace("–", "-")
+        .replace("—", "-")
+    )
+
+
+def _is_definitive(e: Exception) -> bool:
+    # Pyrogram's own lookups raise e.g. ValueError("Peer id invalid: ...")
+    error_msg = str(e).upper().replace(" ", "_")
+    return any(code in error_msg for code in DEFINITIVE_ERRORS)
+
+
+def _lookup_target(ref: str):
+    if ref.startswith("-") or ref.isdigit():
+        return int(ref)
+    return ref if ref.startswith("@") else f"@{ref}"
+
+
+class PeerResolver:
+    """
+    Resolves chat references (@username or numeric id) per account.
+    Results are kept in the peer_cache table: successes for PEER_CACHE_TTL,
+    definitive failures (see DEFINITIVE_ERRORS) for PEER_NEGATIVE_TTL. Pyrogram keeps the access hashes in its
+    session file, so a fresh cached id can be used without any API call.
+    Unknown numeric ids fall back to a dialog scan at most once per process.
+    """
+
+    def __init__(self):
+        self._client_ids: dict[int, int] = {}
+        self._client_is_bot: dict[int, bool] = {}
+        self._scanned: set[int] = set()
+        self._scan_locks: dict[int, asyncio.Lock] = {}
+        self._ref_locks: dict[tuple, asyncio.Lock] = {}
+
+    async def _client_key(self, client: Client) -> int:
+        key = self._client_ids.get(id(client))
+        if key is None:
+            me = await client.get_me()
+            key = self._client_ids[id(client)] = me.id
+            self._client_is_bot[key] = bool(getattr(me, "is_bot", False))
+        return key
+
+    async def resolve(self, client: Client, chat_ref) -> ResolvedChat:
+        ref = normalize_chat_ref(chat_ref)
+        key = await self._client_key(client)
+        lock = self._ref_locks.setdefault((key, ref), asyncio.Lock())
+        async with lock:
+            entry = await db.get_peer(key, ref)
+            if entry:
+                age = time.time() - entry["verified_at"]
+                if entry["status"] == "ok" and age < PEER_CACHE_TTL:
+                    return ResolvedChat(entry["chat_id"], entry["username"])
+                if entry["status"] == "failed" and age < PEER_NEGATIVE_TTL:
+                    raise PeerResolveError(entry["error"] or f"Cannot resolve {ref}")
+
+            try:
+                chat = await self._lookup(client, key, ref, entry)
+            except Exception as e:
+                if _is_definitive(e):
+                    await db.save_peers(key, [(ref, None, None, "failed", str(e), time.time())])
+                raise
+
+            await db.save_peers(key, [(ref, chat.id, chat.username, "ok", None, time.time())])
+            return ResolvedChat(chat.id, chat.username)
+
+    async def _lookup(self, client: Client, key: int, ref: str, entry: dict | None):
+        target = _lookup_target(ref)
+        try:
+            return await client.get_chat(target)
+        except Exception as first_error:
+            # A known username lets Telegram resolve the peer directly
+            username = entry.get("username") if entry else None
+            if username:
+                try:
+                    return await client.get_chat(f"@{username}")
+                except Exception:
+                    pass
+            if isinstance(target, str) or self._client_is_bot.get(key):
+                raise first_error
+            await self._scan_dialogs(client, key)
+            return await client.get_chat(target)
+
+    async def _scan_dialogs(self, client: Client, key: int):
+        """
+        Walk the dialogs once per process so pyrogram learns their access
+        hashes; every chat seen is stored as a resolved entry as well.
+        """
+        lock = self._scan_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if key in self._scanned:
+                return
+            self._scanned.add(key)
+            print("Peer cache: scanning dialogs once to learn unknown chats...")
+            now = time.time()
+            entries = []
+            try:
+                async for dialog in client.get_dialogs(limit=DIALOG_SCAN_LIMIT):
+                    chat = dialog.chat
+                    entries.append((str(chat.id), chat.id, chat.username, "ok", None, now))
+            except Exception as e:
+                print(f"Peer cache: dialog scan failed: {str(e)}")
+            await db.save_peers(key, entries)
+            print(f"Peer cache: {len(entries)} chats stored.")
+
+    async def forget(self, client: Client, chat_ref):
+        """Drop a cached entry, e.g. after PEER_ID_INVALID on a cached id"""
+        key = await self._client_key(client)
+        await db.forget_peer(key, normalize_chat_ref(chat_ref))
+
+
+peer_resolver = PeerResolver()
@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+try:
+    from config import SEND_RATE_PER_CHAT, SEND_BURST_PER_CHAT, SEND_RATE_GLOBAL
+except ImportError:
+    SEND_RATE_PER_CHAT = '1'
+    SEND_BURST_PER_CHAT = '3'
+    SEND_RATE_GLOBAL = '25'
+
+try:
+    SEND_RATE_PER_CHAT = max(0.01, float(SEND_RATE_PER_CHAT))
+    SEND_BURST_PER_CHAT = max(1.0, float(SEND_BURST_PER_CHAT))
+    SEND_RATE_GLOBAL = max(0.01, float(SEND_RATE_GLOBAL))
+except (TypeError, ValueError):
+    SEND_RATE_PER_CHAT = 1.0
+    SEND_BURST_PER_CHAT = 3.0
+    SEND_RATE_GLOBAL = 25.0
+
+
+class TokenBucket:
+    """
+    Token bucket with reservations: every caller takes its tokens right away
+    (the balance may go negative) and is told how long to wait for them.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        # Refill starts from here; lies in the future while a flood wait is active
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def _delay(self, now: float, tokens: float) -> float:
+        return max(0.0, self.updated - now) + max(0.0, -tokens) / self.rate
+
+    def reserve(self, cost: float = 1) -> float:
+        """Take cost tokens; returns seconds to wait before using them"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= cost
+        return self._delay(now, self.tokens)
+
+    def wait_time(self, cost: float = 1) -> float:
+        """Seconds a new caller would wait, without reserving anything"""
+        now = time.monotonic()
+        self._refill(now)
+        return self._delay(now, self.tokens - cost)
+
+    def block(self, seconds: float):
+        """Hold every caller back for seconds (Telegram flood wait)"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = min(self.tokens, 0)
+        self.updated = max(self.updated, now + seconds)
+
+
+class RateLimiter:
+    """Send pacing per (sender, target chat) plus one global bucket per sender"""
+
+    def __init__(
+        self,
+        chat_rate: float = SEND_RATE_PER_CHAT,
+        chat_burst: float = SEND_BURST_PER_CHAT,
+        global_rate: float = SEND_RATE_GLOBAL,
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_rate = global_rate
+        self._chats: dict[tuple, TokenBucket] = {}
+        self._globals: dict[int, TokenBucket] = {}
+
+    def _buckets(self, sender, chat_id) -> tuple[TokenBucket, TokenBucket]:
+        key = (id(sender), str(chat_id))
+        chat_bucket = self._chats.get(key)
+        if chat_bucket is None:
+            chat_bucket = self._chats[key] = TokenBucket(self.chat_rate, self.chat_burst)
+        global_bucket = self._globals.get(id(sender))
+        if global_bucket is None:
+            global_bucket = self._globals[id(sender)] = TokenBucket(self.global_rate, self.global_rate)
+        return chat_bucket, global_bucket
+
+    async def acquire(self, sender, chat_id, cost: int = 1) -> float:
+        """Wait for permission to send cost messages; returns the time waited"""
+        chat_bucket, global_bucket = self._buckets(sender, chat_id)
+        delay = max(chat_bucket.reserve(cost), global_bucket.reserve(cost))
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def flood_wait(self, sender, chat_id, seconds: float):
+        """Telegram asked to wait: flood waits apply to the whole account"""
+        chat_bucket, global_bucket = self._buckets(sender, chat_id)
+        chat_bucket.block(seconds)
+        global_bucket.block(seconds)
+
+    def wait_time(self, sender=None, chat_id=None) -> float:
+        """
+        Current queue wait in seconds for one chat of a sender, or the
+        longest one over all known chats when no chat is given.
+        """
+        if sender is not None and chat_id is not None:
+            chat_bucket, global_bucket = self._buckets(sender, chat_id)
+            return max(chat_bucket.wait_time(), global_bucket.wait_time())
+        waits = [bucket.wait_time() for bucket in self._chats.values()]
+        waits += [bucket.wait_time() for bucket in self._globals.values()]
+        return max(waits, default=0.0)
+
+
+rate_limiter = RateLimiter()
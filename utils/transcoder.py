@@ -0,0 +1,231 @@
+from collections import OrderedDict
+import asyncio
+import os
+import re
+import time
+
+try:
+    from config import TRANSCODE_CONCURRENCY, TRANSCODE_TIMEOUT
+except ImportError:
+    TRANSCODE_CONCURRENCY = '0'
+    TRANSCODE_TIMEOUT = '120'
+
+try:
+    # 0 = one ffmpeg per CPU core
+    TRANSCODE_CONCURRENCY = int(TRANSCODE_CONCURRENCY) or (os.cpu_count() or 1)
+    TRANSCODE_TIMEOUT = float(TRANSCODE_TIMEOUT)
+except (TypeError, ValueError):
+    TRANSCODE_CONCURRENCY = os.cpu_count() or 1
+    TRANSCODE_TIMEOUT = 120.0
+
+try:
+    from config import VIDEO_NOTE_CACHE_DIR, VIDEO_NOTE_CACHE_MB
+except ImportError:
+    VIDEO_NOTE_CACHE_DIR = 'video_note_cache'
+    VIDEO_NOTE_CACHE_MB = '500'
+
+try:
+    VIDEO_NOTE_CACHE_BYTES = int(float(VIDEO_NOTE_CACHE_MB) * 1024 * 1024)
+except (TypeError, ValueError):
+    VIDEO_NOTE_CACHE_BYTES = 500 * 1024 * 1024
+
+# Check for local ffmpeg
+LOCAL_FFMPEG = os.path.join(os.getcwd(), 'ffmpeg.exe')
+FFMPEG_CMD = LOCAL_FFMPEG if os.path.exists(LOCAL_FFMPEG) else 'ffmpeg'
+
+_slots = asyncio.Semaphore(max(1, TRANSCODE_CONCURRENCY))
+
+# Finished conversions this session (durations in seconds)
+transcode_stats = {"jobs": 0, "failed": 0, "total_seconds": 0.0, "last_seconds": 0.0, "max_seconds": 0.0}
+
+
+def _record_job(seconds: float, ok: bool):
+    transcode_stats["jobs"] += 1
+    if not ok:
+        transcode_stats["failed"] += 1
+    transcode_stats["total_seconds"] += seconds
+    transcode_stats["last_seconds"] = seconds
+    transcode_stats["max_seconds"] = max(transcode_stats["max_seconds"], seconds)
+
+
+def _remove_output(path: str):
+    if os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+async def _run_ffmpeg(cmd: list[str], output_path: str) -> bool:
+    """Run one ffmpeg job in a pool slot; False on error or timeout"""
+    async with _slots:
+        started = time.monotonic()
+        ok = False
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+        except Exception as e:
+            print(f"FFmpeg conversion error: {e}")
+            _record_job(time.monotonic() - started, False)
+            return False
+
+        try:
+            return_code = await asyncio.wait_for(process.wait(), TRANSCODE_TIMEOUT)
+            ok = return_code == 0
+            if not ok:
+                print(f"FFmpeg conversion error: exit code {return_code}")
+        except asyncio.TimeoutError:
+            print(f"FFmpeg conversion timed out after {TRANSCODE_TIMEOUT:g}s")
+        finally:
+            # Also runs on cancellation: never leave ffmpeg running
+            if process.returncode is None:
+                process.kill()
+                await asyncio.shield(process.wait())
+            seconds = time.monotonic() - started
+            _record_job(seconds, ok)
+            if not ok:
+                _remove_output(output_path)
+
+        if ok:
+            print(f"Video note converted in {seconds:.1f}s")
+        return ok
+
+
+async def convert_video_note(input_path: str, output_path: str) -> bool:
+    """
+    Convert video to a 1:1 round video note format (384x384).
+    Returns True if successful, False otherwise.
+    """
+    cmd = [
+        FFMPEG_CMD, '-y',
+        '-i', input_path,
+        '-vf', 'crop=min(iw,ih):min(iw,ih),scale=384:384',
+        '-c:v', 'libx264',
+        '-preset', 'fast',
+        '-crf', '26',
+        '-c:a', 'aac',
+        '-b:a', '64k',
+        '-t', '59',
+        '-pix_fmt', 'yuv420p',
+        output_path
+    ]
+    return await _run_ffmpeg(cmd, output_path)
+
+
+class ConvertedCache:
+    """
+    Converted video notes on disk, keyed by the source file_unique_id.
+    Least recently used files are evicted once the total size exceeds
+    max_bytes; the order survives restarts through file mtimes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._files: OrderedDict[str, int] | None = None
+        self._size = 0
+        # Conversions in progress, so the same source is converted once
+        self._pending: dict[str, asyncio.Task] = {}
+        # Paths being sent right now -> number of users; never evicted
+        self._pinned: dict[str, int] = {}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, re.sub(r'[^A-Za-z0-9_-]', '_', key) + ".mp4")
+
+    def _load(self):
+        if self._files is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".mp4") and os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, path, stat.st_size))
+        entries.sort()
+        self._files = OrderedDict((path, size) for _, path, size in entries)
+        self._size = sum(self._files.values())
+
+    def pin(self, key: str):
+        """Keep key's file on disk until unpin, even if it is evicted meanwhile"""
+        path = self._path(key)
+        self._pinned[path] = self._pinned.get(path, 0) + 1
+
+    def unpin(self, key: str):
+        path = self._path(key)
+        count = self._pinned.get(path, 0) - 1
+        if count > 0:
+            self._pinned[path] = count
+        else:
+            self._pinned.pop(path, None)
+
+    def get(self, key: str) -> str | None:
+        """Cached conversion for key, marked as recently used"""
+        self._load()
+        path = self._path(key)
+        if path not in self._files:
+            return None
+        if not os.path.exists(path):
+            self._size -= self._files.pop(path)
+            return None
+        self._files.move_to_end(path)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def put(self, key: str, converted_path: str) -> str:
+        """Move a finished conversion into the cache; returns its new path"""
+        self._load()
+        path = self._path(key)
+        os.replace(converted_path, path)
+        self._size -= self._files.pop(path, 0)
+        self._files[path] = os.path.getsize(path)
+        self._size += self._files[path]
+        self._evict(keep=path)
+        return path
+
+    def _evict(self, keep: str):
+        for path in list(self._files):
+            if self._size <= self.max_bytes:
+                break
+            if path == keep or path in self._pinned:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # Still open elsewhere (e.g. being uploaded); try again later
+                continue
+            self._size -= self._files.pop(path)
+
+    async def convert(self, key: str, input_path: str) -> str | None:
+        """Cached conversion of input_path, running ffmpeg only on a miss"""
+        cached = self.get(key)
+        if cached:
+            return cached
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._convert(key, input_path))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _convert(self, key: str, input_path: str) -> str | None:
+        converted_path = f"{input_path}_converted.mp4"
+        if not await convert_video_note(input_path, converted_path):
+            return None
+        try:
+            return self.put(key, converted_path)
+        except OSError as e:
+            print(f"Video note cache error: {e}")
+            _remove_output(converted_path)
+            return None
+
+
+video_note_cache = ConvertedCache(VIDEO_NOTE_CACHE_DIR, VIDEO_NOTE_CACHE_BYTES)